@@ -0,0 +1,213 @@
+#!/usr/bin/python3.7
+import argparse, importlib.util, math, sys
+import numpy as np
+from population import Entity, move_arrays
+from spatial import grid_pairs
+
+"""
+   A backend implements the kernels of a step:
+     pairs(x, y, distance): index pairs (i < j) within infectious distance in ascending pair order
+     infection_candidates(first, second, state): (sources, candidates) of the new contacts in pair order: the entities which
+       can be infected by them and their infected partners
+     move(x, y, direction, distance, area_size): move the entities in place, reflecting them from the walls
+   The python and the numpy backend give exactly the same results (they compute the directions with
+   the same numpy ufuncs). The numba kernels call the compiled trigonometric functions, which can differ
+   from numpy's in the last bit, so their positions are only compared with a tolerance. The state
+   changes are not kernels, they are driven by the expiry queue of the population.
+"""
+
+# ===========================================
+# =           PythonBackend Class           =
+# ===========================================
+
+class PythonBackend:
+
+	""" Reference implementation in plain Python (slow, every pair is compared) """
+	name = 'python'
+
+	def pairs(self, x, y, distance):
+		x = x.tolist()
+		y = y.tolist()
+		limit = math.pow(distance, 2)
+		first = []
+		second = []
+		for i in range(len(x)):
+			for j in range(i + 1, len(x)):
+				dx = abs(x[i] - x[j])
+				dy = abs(y[i] - y[j])
+				if dx <= distance and dy <= distance and dx * dx + dy * dy <= limit:
+					first.append(i)
+					second.append(j)
+		return np.array(first, dtype=np.int64), np.array(second, dtype=np.int64)
+
+	def infection_candidates(self, first, second, state):
+		sources = []
+		candidates = []
+		for i, j in zip(first.tolist(), second.tolist()):
+			if state[i] == Entity.STATE_INFECTED and state[j] == Entity.STATE_HEALTHY:
+				sources.append(i)
+				candidates.append(j)
+			elif state[j] == Entity.STATE_INFECTED and state[i] == Entity.STATE_HEALTHY:
+				sources.append(j)
+				candidates.append(i)
+		return sources, candidates
+
+	def move(self, x, y, direction, distance, area_size):
+		# the same cos and sin as in the numpy backend, math.cos can differ from them in the last bit
+		steps_x = (np.cos(direction) * distance).tolist()
+		steps_y = (np.sin(direction) * distance).tolist()
+		for i in range(len(x)):
+			old_x = (float)(x[i])
+			old_y = (float)(y[i])
+			angle = (float)(direction[i])
+			dx = steps_x[i]
+			dy = steps_y[i]
+			new_x = old_x + dx
+			new_y = old_y + dy
+			if new_x < 0 or new_x > area_size[0]:
+				new_x = old_x - dx
+				angle = math.pi - angle
+			if new_y < 0 or new_y > area_size[1]:
+				new_y = old_y - dy
+				angle = 2 * math.pi - angle
+			x[i] = new_x
+			y[i] = new_y
+			direction[i] = angle
+
+
+# ======  End of PythonBackend Class  =======
+
+
+# ==========================================
+# =           NumpyBackend Class           =
+# ==========================================
+
+class NumpyBackend:
+
+	""" Vectorized implementation (uniform grid for the pairs) """
+	name = 'numpy'
+
+	def pairs(self, x, y, distance):
+		return grid_pairs(x, y, distance)
+
+	def infection_candidates(self, first, second, state):
+		state1 = state[first]
+		state2 = state[second]
+		# first infects second, or the other way round
+		forward = (state1 == Entity.STATE_INFECTED) & (state2 == Entity.STATE_HEALTHY)
+		backward = (state2 == Entity.STATE_INFECTED) & (state1 == Entity.STATE_HEALTHY)
+		selected = forward | backward
+		sources = np.where(forward, first, second)[selected]
+		candidates = np.where(forward, second, first)[selected]
+		return sources.tolist(), candidates.tolist()
+
+	def move(self, x, y, direction, distance, area_size):
+		move_arrays(x, y, direction, distance, area_size)
+
+
+# ======  End of NumpyBackend Class  =======
+
+
+# ==========================================
+# =           NumbaBackend Class           =
+# ==========================================
+
+class NumbaBackend(NumpyBackend):
+
+	""" Numba compiled kernels (numba is only imported, and the kernels compiled, when this backend is created) """
+	name = 'numba'
+
+	def __init__(self):
+		import numba_kernels
+		self._kernels = numba_kernels
+
+	def pairs(self, x, y, distance):
+		if len(x) < 2:
+			return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+		# the grid is arranged the same way as in grid_pairs, the pairs of the cells are compared in the kernel
+		cell_size = max(distance, 1)
+		cx = np.floor(x / cell_size).astype(np.int64)
+		cy = np.floor(y / cell_size).astype(np.int64)
+		cx -= cx.min()
+		cy -= cy.min()
+		width = (int)(cx.max()) + 3
+		keys = (cy + 1) * width + (cx + 1)
+		order = np.argsort(keys, kind='stable')
+		cells, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+		limit = math.pow(distance, 2)
+		# the first pass counts the pairs, the second one fills them in
+		found = self._kernels.scan_pairs(x, y, order, cells, starts, counts, width, (float)(distance), limit, None, None)
+		i = np.empty(found, dtype=np.int64)
+		j = np.empty(found, dtype=np.int64)
+		self._kernels.scan_pairs(x, y, order, cells, starts, counts, width, (float)(distance), limit, i, j)
+		pair_order = np.lexsort((j, i))
+		return i[pair_order], j[pair_order]
+
+	def move(self, x, y, direction, distance, area_size):
+		self._kernels.move(x, y, direction, (float)(distance), (float)(area_size[0]), (float)(area_size[1]))
+
+
+# ======  End of NumbaBackend Class  =======
+
+
+BACKENDS = {backend.name: backend for backend in (PythonBackend, NumpyBackend, NumbaBackend)}
+
+""" Names of the backends which can be used here (numba is looked up without importing it) """
+def available_backends():
+	return [name for name in BACKENDS if name != 'numba' or importlib.util.find_spec('numba') is not None]
+
+""" Create a backend by name ('auto' is numba if it is installed, numpy otherwise) """
+def create_backend(name = 'numpy'):
+	if name == 'auto':
+		name = 'numba' if 'numba' in available_backends() else 'numpy'
+	if name not in available_backends():
+		raise ValueError(f"unknown or not installed backend: '{name}' (available: {', '.join(available_backends())})")
+	return BACKENDS[name]()
+
+"""
+   Run the same seeded simulation with every backend and tell which of them differ from the reference
+   The counts and the states have to be equal, the positions equal within tolerance (in pixels).
+"""
+def check_conformance(backends = None, **kwargs):
+	from engine import Engine
+	backends = backends if backends is not None else available_backends()
+	tolerance = kwargs['tolerance'] if 'tolerance' in kwargs else 1e-6
+	settings = kwargs['settings'] if 'settings' in kwargs else {'entity_number': 300, 'infection_chance': 30, 'immunity_time': 5, 'healing_time': 5}
+	duration = kwargs['duration'] if 'duration' in kwargs else 30000 # in milliseconds
+	results = {}
+	for name in backends:
+		engine = Engine(area_size=kwargs['area_size'] if 'area_size' in kwargs else (330, 230), seed=kwargs['seed'] if 'seed' in kwargs else 0, backend=name)
+		engine.change_settings(**settings)
+		engine.populate()
+		history = []
+		while engine.time < duration:
+			engine.step(engine.timestep)
+			history.append(engine.count_states())
+		results[name] = (history, engine.entities.x.copy(), engine.entities.y.copy(), engine.entities.state.copy())
+	reference = results[backends[0]]
+	differing = []
+	for name in backends[1:]:
+		history, x, y, state = results[name]
+		same_positions = np.allclose(x, reference[1], rtol=0, atol=tolerance) and np.allclose(y, reference[2], rtol=0, atol=tolerance)
+		if history != reference[0] or not same_positions or not np.array_equal(state, reference[3]):
+			differing.append(name)
+	return differing
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description='Check that every compute backend gives the same seeded run.')
+	parser.add_argument('--backends', default=','.join(available_backends()), help='backends to compare, the first one is the reference (default: every available one)')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the runs (default: 0)')
+	parser.add_argument('--duration', type=float, default=30, help='simulated time (sec, default: 30)')
+	parser.add_argument('--tolerance', type=float, default=1e-6, help='largest difference of the positions (px, default: 1e-6; 0 requires equal positions)')
+	args = parser.parse_args(argv)
+	backends = args.backends.split(',')
+	differing = check_conformance(backends, seed=args.seed, duration=args.duration * 1000, tolerance=args.tolerance)
+	for name in backends[1:]:
+		print(f"{name}: {'DIFFERS from' if name in differing else 'same as'} {backends[0]}")
+	return 1 if differing else 0
+
+
+# -----------  Start the check  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
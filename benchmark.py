@@ -0,0 +1,178 @@
+#!/usr/bin/python3.7
+import argparse, itertools, json, math, platform, sys, time, tracemalloc
+from datetime import datetime
+import numpy as np
+from engine import Engine
+from parallel import ParallelEngine
+import headless
+try:
+	import cairo
+	from renderer import Renderer
+except ImportError:
+	cairo = None
+
+""" Parse a comma separated list of numbers """
+def number_list(value):
+	try:
+		return [float(item) if '.' in item else int(item) for item in value.split(',')]
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"invalid list: '{value}' (expected comma separated numbers)")
+
+""" Name of a benchmark case (results are compared by it) """
+def case_name(entity_number, density, distance):
+	return f"n={entity_number};density={density};distance={distance}"
+
+""" Square area in which entity_number entities have the given density (entities per 100x100 px) """
+def case_area_size(entity_number, density):
+	side = max((int)(math.sqrt(entity_number / density) * 100), 1)
+	return (side, side)
+
+""" Create a populated engine for a case and the time populating it took (in seconds) """
+def create_engine(entity_number, density, distance, seed, processes = 1, backend = 'numpy'):
+	if processes > 1:
+		engine = ParallelEngine(area_size=case_area_size(entity_number, density), seed=seed, processes=processes, backend=backend)
+	else:
+		engine = Engine(area_size=case_area_size(entity_number, density), seed=seed, backend=backend)
+	engine.change_settings(
+		entity_number=entity_number,
+		initial_virus_carrier_number=max(entity_number // 100, 1),
+		infectious_distance=distance,
+	)
+	engine.profiler.enabled = False
+	start = time.perf_counter()
+	engine.populate()
+	return engine, time.perf_counter() - start
+
+""" Time the steps of a case, running at least min_time seconds and min_steps steps """
+def measure_steps(engine, warmup, min_steps, min_time):
+	for i in range(warmup):
+		engine.step(engine.timestep)
+	steps = 0
+	start = time.perf_counter()
+	while steps < min_steps or time.perf_counter() - start < min_time:
+		engine.step(engine.timestep)
+		steps += 1
+	return steps / (time.perf_counter() - start)
+
+""" Time drawing the whole world into an offscreen surface of a window's size (None without cairo) """
+def measure_render(engine, size, min_frames, min_time):
+	if cairo is None:
+		return None
+	renderer = Renderer()
+	width, height = size
+	surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+	context = cairo.Context(surface)
+	frames = 0
+	start = time.perf_counter()
+	while frames < min_frames or time.perf_counter() - start < min_time:
+		renderer.draw(context, width, height, engine.entities, engine.area_size)
+		frames += 1
+	surface.flush()
+	return frames / (time.perf_counter() - start)
+
+""" Memory of the simulation state and the peak allocated by one step (in bytes) """
+def measure_memory(engine):
+	state = engine.entities.nbytes() + engine.contacts.nbytes()
+	tracemalloc.start()
+	engine.step(engine.timestep)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return state, peak
+
+""" Run one case """
+def run_case(entity_number, density, distance, args):
+	engine, populate_seconds = create_engine(entity_number, density, distance, args.seed, args.processes, args.backend)
+	try:
+		steps_per_second = measure_steps(engine, args.warmup, args.min_steps, args.min_time)
+		render_per_second = measure_render(engine, args.render_size, args.min_steps, args.min_time) if not args.no_render else None
+		state_memory, step_memory = measure_memory(engine)
+	finally:
+		if isinstance(engine, ParallelEngine):
+			engine.close()
+	return {
+		'name': case_name(entity_number, density, distance),
+		'entity_number': entity_number,
+		'density': density,
+		'distance': distance,
+		'area_size': list(engine.area_size),
+		'populate_seconds': populate_seconds,
+		'steps_per_second': steps_per_second,
+		'entities_per_second': steps_per_second * entity_number,
+		'frames_per_second': render_per_second,
+		'state_memory': state_memory,
+		'step_memory': step_memory,
+	}
+
+""" Cases slower than the baseline by more than tolerance (name -> ratio of the speeds) """
+def compare(results, baseline, tolerance):
+	previous = {result['name']: result for result in baseline['results']}
+	regressions = {}
+	for result in results:
+		if result['name'] not in previous:
+			continue
+		for key in ('steps_per_second', 'frames_per_second'):
+			if result[key] is None or previous[result['name']][key] is None:
+				continue
+			ratio = result[key] / previous[result['name']][key]
+			if ratio < 1 - tolerance:
+				regressions[result['name'] + ':' + key] = ratio
+	return regressions
+
+def create_parser():
+	parser = argparse.ArgumentParser(description='Benchmark the simulation step and the rendering across population sizes, densities and infectious distances.')
+	parser.add_argument('--sizes', type=number_list, default=[100, 1000, 10000, 100000], help='entity numbers (default: 100,1000,10000,100000)')
+	parser.add_argument('--densities', type=number_list, default=[1, 5, 20], help='entities per 100x100 px (default: 1,5,20)')
+	parser.add_argument('--distances', type=number_list, default=[5, 10, 20], help='infectious distances in px (default: 5,10,20)')
+	parser.add_argument('--seed', type=int, default=0, help='seed of every case (default: 0)')
+	parser.add_argument('--processes', type=int, default=1, help='step the simulation in this many worker processes (default: 1)')
+	parser.add_argument('--backend', default='numpy', help='kernels of the steps: python, numpy, numba or auto (default: numpy)')
+	parser.add_argument('--warmup', type=int, default=5, help='untimed steps before the measurement (default: 5)')
+	parser.add_argument('--min-steps', type=int, default=10, help='minimum number of timed steps and frames (default: 10)')
+	parser.add_argument('--min-time', type=float, default=1, help='minimum time of a measurement (sec, default: 1)')
+	parser.add_argument('--render-size', type=headless.area_size, default=(800, 600), help='size of the surface the world is drawn into (default: 800x600)')
+	parser.add_argument('--no-render', action='store_true', help='do not benchmark the rendering')
+	parser.add_argument('--save', metavar='FILE', help='store the results in this JSON file')
+	parser.add_argument('--baseline', metavar='FILE', help='compare the results with a stored run (exit status is 1 on regression)')
+	parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown compared to the baseline (default: 0.1)')
+	return parser
+
+def main(argv = None):
+	args = create_parser().parse_args(argv)
+	baseline = None
+	if args.baseline:
+		with open(args.baseline) as file:
+			baseline = json.load(file)
+	previous = {result['name']: result for result in baseline['results']} if baseline is not None else {}
+	if cairo is None and not args.no_render:
+		print('cairo is not available, the rendering is not benchmarked', file=sys.stderr)
+	print(f"{'case':<36} {'steps/s':>10} {'entities/s':>12} {'frames/s':>10} {'state KiB':>10} {'step KiB':>10} {'populate ms':>12} {'vs baseline':>12}")
+	results = []
+	for entity_number, density, distance in itertools.product(args.sizes, args.densities, args.distances):
+		result = run_case(entity_number, density, distance, args)
+		results.append(result)
+		frames = f"{result['frames_per_second']:.1f}" if result['frames_per_second'] is not None else '-'
+		ratio = f"{result['steps_per_second'] / previous[result['name']]['steps_per_second']:.2f}x" if result['name'] in previous else '-'
+		print(f"{result['name']:<36} {result['steps_per_second']:>10.1f} {result['entities_per_second']:>12.0f} {frames:>10} {result['state_memory'] / 1024:>10.1f} {result['step_memory'] / 1024:>10.1f} {result['populate_seconds'] * 1000:>12.1f} {ratio:>12}")
+	if args.save:
+		with open(args.save, 'w') as file:
+			json.dump({
+				'date': datetime.now().isoformat(timespec='seconds'),
+				'python': platform.python_version(),
+				'numpy': np.__version__,
+				'machine': platform.platform(),
+				'processes': args.processes,
+				'backend': args.backend,
+				'results': results,
+			}, file, indent='\t')
+	if baseline is not None:
+		regressions = compare(results, baseline, args.tolerance)
+		for name, ratio in regressions.items():
+			print(f"regression: {name} is at {ratio:.2f}x of the baseline", file=sys.stderr)
+		return 1 if regressions else 0
+	return 0
+
+
+# -----------  Start the benchmark  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
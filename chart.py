@@ -0,0 +1,91 @@
+import cairo
+from population import Entity
+
+# ===================================
+# =           Chart Class           =
+# ===================================
+
+class Chart:
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		self.background_color = kwargs['background_color'] if 'background_color' in kwargs else (1, 1, 1)
+		self.entity_color = kwargs['entity_color'] if 'entity_color' in kwargs else {
+			Entity.STATE_HEALTHY: (0, 1, 0),
+			Entity.STATE_INFECTED: (1, 0, 0),
+			Entity.STATE_IMMUNE: (0, 0, 1),
+		}
+		self.initial_span = kwargs['initial_span'] if 'initial_span' in kwargs else 60000 # time shown at first, doubled whenever the run gets longer (in milliseconds)
+		self._surface = None
+		self._key = None # (width, height, span, level, version) the surface was drawn for
+		self._drawn = 0 # buckets of the level which are on the surface
+		self._span = self.initial_span
+
+	"""
+	   Draw the history: a band between the minimum and the maximum share of every state per bucket
+	   Only the buckets which are new since the last call are drawn onto the cached surface; it is
+	   redrawn from the start when the size, the time span or the level of the history changes.
+	   The mean-field estimate (if given, with a prepared curve) is drawn as dashed lines.
+	"""
+	def draw(self, context, width, height, history, estimate = None):
+		level, version = history.view()
+		first, start, end, low, high = history.buckets(level, self._drawn if self._key is not None and self._key[3:] == (level, version) else 0)
+		while len(end) > 0 and end[-1] > self._span:
+			self._span *= 2
+		key = (width, height, self._span, level, version)
+		if key != self._key:
+			self._surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, max(width, 1), max(height, 1))
+			self._key = key
+			self._drawn = 0
+			first, start, end, low, high = history.buckets(level, 0)
+			self._draw_background(width, height, estimate)
+		if len(start) > 0:
+			surface_context = cairo.Context(self._surface)
+			x_scale = width / self._span
+			left = start * x_scale
+			# the buckets reach the next one, so there are no gaps between them
+			right = end * x_scale + 1
+			for s, state in enumerate(Entity.STATES):
+				color = self.entity_color[state]
+				surface_context.set_source_rgba(color[0], color[1], color[2], 0.8)
+				top = (1 - high[:, s]) * (height - 1)
+				bottom = (1 - low[:, s]) * (height - 1) + 1
+				for i in range(len(left)):
+					surface_context.rectangle(left[i], top[i], right[i] - left[i], bottom[i] - top[i])
+				surface_context.fill()
+			self._drawn = first + len(start)
+		context.set_source_surface(self._surface, 0, 0)
+		context.paint()
+
+	""" Start again with the initial time span """
+	def clear(self):
+		self._span = self.initial_span
+		self._key = None
+
+	def _draw_background(self, width, height, estimate):
+		context = cairo.Context(self._surface)
+		context.set_source_rgb(self.background_color[0], self.background_color[1], self.background_color[2])
+		context.paint()
+		context.set_source_rgb(0.5, 0.5, 0.5)
+		context.set_font_size(9)
+		context.move_to(2, height - 2)
+		context.show_text(f"{self._span / 1000:.0f} mp")
+		if estimate is None or estimate.entity_number == 0:
+			return
+		# expected shares at every pixel column (the curve of the estimate is only interpolated, it is computed by the simulation thread)
+		points = [estimate.at(x / max(width - 1, 1) * self._span, extend=False) for x in range(width)]
+		context.set_dash([3, 3])
+		context.set_line_width(1)
+		for s, state in enumerate(Entity.STATES):
+			color = self.entity_color[state]
+			context.set_source_rgb(color[0] * 0.6, color[1] * 0.6, color[2] * 0.6)
+			for x in range(width):
+				y = (1 - points[x][s] / estimate.entity_number) * (height - 1)
+				if x == 0:
+					context.move_to(x, y)
+				else:
+					context.line_to(x, y)
+			context.stroke()
+
+
+# ======  End of Chart Class  =======
@@ -0,0 +1,66 @@
+import json, os
+import numpy as np
+from contacts import ContactSet
+from engine import Engine, SETTINGS
+from population import Population
+
+"""
+   A checkpoint is an uncompressed .npz archive of the complete simulation state:
+     the entity arrays and the member order of the states, the contact keys,
+     the clock, the area size, the settings and the state of the random number generator.
+   Continuing from a checkpoint gives the same run as if the simulation was never stopped.
+"""
+VERSION = 1
+
+""" Save the state of an engine (written into a temporary file first, so a crash never leaves a broken checkpoint behind) """
+def save(engine, path):
+	entities = engine.entities
+	version, mt, gauss_next = engine.random.getstate()
+	temporary = path + '.tmp'
+	with open(temporary, 'wb') as file:
+		np.savez(
+			file,
+			version=np.array(VERSION),
+			settings=np.array(json.dumps({key: getattr(engine, key) for key in SETTINGS})),
+			time=np.array(engine.time, dtype=np.int64),
+			time_debt=np.array(engine._time_debt, dtype=np.float64),
+			area_size=np.array(engine.area_size, dtype=np.int64),
+			x=entities.x,
+			y=entities.y,
+			direction=entities.direction,
+			state=entities.state,
+			state_time=entities.state_time,
+			member_order=entities.member_order(),
+			contacts=engine.contacts.keys(),
+			random_version=np.array(version),
+			random_state=np.array(mt, dtype=np.uint64),
+			random_gauss_next=np.array(np.nan if gauss_next is None else gauss_next),
+		)
+	os.replace(temporary, path)
+
+""" Load a checkpoint into an engine (a new one if not given) and return the engine """
+def load(path, engine = None):
+	if engine is None:
+		engine = Engine()
+	with np.load(path, allow_pickle=False) as data:
+		if (int)(data['version']) != VERSION:
+			raise ValueError(f"{path} has an unsupported checkpoint version")
+		engine.reset()
+		for key, value in json.loads(str(data['settings'])).items():
+			setattr(engine, key, value)
+		engine.area_size = tuple((int)(value) for value in data['area_size'])
+		engine.entities = Population.restore(
+			data['x'], data['y'], data['direction'], data['state'], data['state_time'], data['member_order'],
+			engine._state_durations(),
+		)
+		engine.contacts = ContactSet(data['contacts'])
+		engine.time = (int)(data['time'])
+		engine._time_debt = (float)(data['time_debt'])
+		gauss_next = (float)(data['random_gauss_next'])
+		engine.random.setstate((
+			(int)(data['random_version']),
+			tuple((int)(value) for value in data['random_state']),
+			None if np.isnan(gauss_next) else gauss_next,
+		))
+	engine.trace('Checkpoint loaded from %s at %d ms', path, engine.time)
+	return engine
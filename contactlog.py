@@ -0,0 +1,258 @@
+#!/usr/bin/python3.7
+import argparse, os, struct, sys, threading
+import numpy as np
+from contacts import pack_pairs, unpack_pairs
+from population import Entity
+
+"""
+   File layout:
+     header: magic, version, entity number
+     events: fixed size records, appended step by step (in time order)
+
+   event: time (uint32, ms), kind (uint8), outcome (uint8), first (uint32), second (uint32)
+     CONTACT_START: first < second came within infectious distance, outcome is 1 if the contact infected one of them
+     CONTACT_END:   first < second got out of infectious distance
+     INFECTION:     first infected second (first is NO_SOURCE for the initial carriers and the random infections)
+"""
+MAGIC = b'HICL'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+EVENT = np.dtype([('time', '<u4'), ('kind', 'u1'), ('outcome', 'u1'), ('first', '<u4'), ('second', '<u4')])
+
+CONTACT_START = 0
+CONTACT_END = 1
+INFECTION = 2
+NO_SOURCE = 0xFFFFFFFF
+
+# ==============================================
+# =           ContactLogWriter Class           =
+# ==============================================
+
+class ContactLogWriter:
+
+	"""
+	   Constructor (the entities infected in population are logged as infections without a source)
+	   With append an existing log is continued at time (a resumed run): its events from time on are
+	   dropped, as the run which wrote them goes on from an earlier checkpoint, and nothing is logged
+	   for population. A log which does not exist yet is started as usual.
+	"""
+	def __init__(self, path, entity_number, **kwargs):
+		self._contacts = kwargs['contacts'] if 'contacts' in kwargs else True # log the contact starts and ends, not only the infections
+		self._batch_size = kwargs['batch_size'] if 'batch_size' in kwargs else 1 << 16 # events collected before they are written
+		time = kwargs['time'] if 'time' in kwargs else 0
+		self._batch = []
+		self._batched = 0
+		self._lock = threading.Lock() # the log can be closed from another thread
+		self.events = 0 # in the log
+		if 'append' in kwargs and kwargs['append'] and os.path.exists(path):
+			self._file = open(path, 'r+b')
+			try:
+				self._continue(path, entity_number, time)
+			except Exception:
+				self._file.close()
+				raise
+			return
+		self._file = open(path, 'wb')
+		self._file.write(HEADER.pack(MAGIC, VERSION, entity_number))
+		population = kwargs['population'] if 'population' in kwargs else None
+		if population is not None:
+			carriers = population.members(Entity.STATE_INFECTED)
+			self._add(self._events(time, INFECTION, np.full(len(carriers), NO_SOURCE), carriers))
+
+	""" Check the header of an existing log and cut it before the first event at time (or later) """
+	def _continue(self, path, entity_number, time):
+		header = self._file.read(HEADER.size)
+		if len(header) < HEADER.size:
+			raise ValueError(f"{path} is not a contact log")
+		magic, version, logged_entity_number = HEADER.unpack(header)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError(f"{path} is not a contact log (or it has an unsupported version)")
+		if logged_entity_number != entity_number:
+			raise ValueError(f"{path} is the log of {logged_entity_number} entities, not {entity_number}")
+		count = (os.path.getsize(path) - HEADER.size) // EVENT.itemsize
+		if count > 0:
+			# the events are in time order
+			times = np.memmap(path, dtype=EVENT, mode='r', offset=HEADER.size, shape=(count,))['time']
+			count = (int)(np.searchsorted(times, time, side='left'))
+			del times
+		self._file.truncate(HEADER.size + count * EVENT.itemsize)
+		self._file.seek(0, os.SEEK_END)
+		self.events = count
+
+	"""
+	   Log a step: previous and current are the packed keys of the pairs in contact before and after it,
+	   new marks the new ones in current, infections are the (source, infected) pairs of the step
+	"""
+	def record(self, time, previous, current, new, infections):
+		parts = []
+		if self._contacts:
+			ended = np.setdiff1d(previous, current, assume_unique=True)
+			parts.append(self._events(time, CONTACT_END, *unpack_pairs(ended)))
+			started = current[new]
+			events = self._events(time, CONTACT_START, *unpack_pairs(started))
+			if len(infections) > 0:
+				pairs = np.array(infections, dtype=np.int64)
+				events['outcome'] = np.isin(started, pack_pairs(pairs.min(axis=1), pairs.max(axis=1)))
+			parts.append(events)
+		if len(infections) > 0:
+			pairs = np.array(infections, dtype=np.int64)
+			parts.append(self._events(time, INFECTION, pairs[:, 0], pairs[:, 1]))
+		for events in parts:
+			self._add(events)
+
+	""" Log an infection without a source (e.g. a random one) """
+	def record_infection(self, time, entity):
+		self._add(self._events(time, INFECTION, np.array([NO_SOURCE]), np.array([entity])))
+
+	def _events(self, time, kind, first, second):
+		events = np.zeros(len(first), dtype=EVENT)
+		events['time'] = time
+		events['kind'] = kind
+		events['first'] = first
+		events['second'] = second
+		return events
+
+	def _add(self, events):
+		if len(events) == 0:
+			return
+		with self._lock:
+			if self._file.closed:
+				return
+			self._batch.append(events)
+			self._batched += len(events)
+			self.events += len(events)
+			if self._batched >= self._batch_size:
+				self._flush()
+
+	def _flush(self):
+		if self._batch:
+			self._file.write(np.concatenate(self._batch).tobytes())
+			self._batch = []
+			self._batched = 0
+
+	""" Write the collected events into the file (e.g. before a checkpoint, so the log has every event until it) """
+	def flush(self):
+		with self._lock:
+			if not self._file.closed:
+				self._flush()
+				self._file.flush()
+
+	def close(self):
+		with self._lock:
+			if not self._file.closed:
+				self._flush()
+				self._file.close()
+
+
+# ======  End of ContactLogWriter Class  =======
+
+
+# ==============================================
+# =           ContactLogReader Class           =
+# ==============================================
+
+class ContactLogReader:
+
+	""" Constructor (the events are mapped, not read; every analysis goes through them chunk by chunk) """
+	def __init__(self, path, **kwargs):
+		self._chunk_size = kwargs['chunk_size'] if 'chunk_size' in kwargs else 1 << 20 # events per chunk
+		with open(path, 'rb') as file:
+			header = file.read(HEADER.size)
+		if len(header) < HEADER.size:
+			raise ValueError(f"{path} is not a contact log")
+		magic, version, self.entity_number = HEADER.unpack(header)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError(f"{path} is not a contact log (or it has an unsupported version)")
+		# a partially written last event (e.g. the simulation is still running) is ignored
+		count = (os.path.getsize(path) - HEADER.size) // EVENT.itemsize
+		self._events = np.memmap(path, dtype=EVENT, mode='r', offset=HEADER.size, shape=(count,)) if count > 0 else np.zeros(0, dtype=EVENT)
+
+	def __len__(self):
+		return len(self._events)
+
+	""" Events in chunks (copies of the mapped records) """
+	def chunks(self):
+		for start in range(0, len(self._events), self._chunk_size):
+			yield np.array(self._events[start:start + self._chunk_size])
+
+	""" Every infection event in time order (a small part of the log) """
+	def infections(self):
+		parts = [chunk[chunk['kind'] == INFECTION] for chunk in self.chunks()]
+		return np.concatenate(parts) if parts else np.zeros(0, dtype=EVENT)
+
+	"""
+	   Transmission tree: (time, source, infected, parent, secondary) per infection in time order
+	   parent is the index of the infection which infected the source (-1 for the roots), secondary is
+	   the number of infections caused by the infected entity until it got infected again.
+	"""
+	def transmission_tree(self):
+		infections = self.infections()
+		time = infections['time'].astype(np.int64)
+		source = infections['first'].astype(np.int64)
+		infected = infections['second'].astype(np.int64)
+		parent = np.full(len(infections), -1, dtype=np.int64)
+		# the last infection of every entity up to the current event
+		last_infection = np.full(self.entity_number, -1, dtype=np.int64)
+		source_list = source.tolist()
+		infected_list = infected.tolist()
+		for k in range(len(infections)):
+			if source_list[k] != NO_SOURCE:
+				parent[k] = last_infection[source_list[k]]
+			last_infection[infected_list[k]] = k
+		secondary = np.bincount(parent[parent >= 0], minlength=len(infections))
+		source[source == NO_SOURCE] = -1
+		return time, source, infected, parent, secondary
+
+	""" Number of entities infected by each entity over the whole log """
+	def secondary_infections(self):
+		counts = np.zeros(self.entity_number, dtype=np.int64)
+		for chunk in self.chunks():
+			sources = chunk['first'][(chunk['kind'] == INFECTION) & (chunk['first'] != NO_SOURCE)]
+			counts += np.bincount(sources.astype(np.int64), minlength=self.entity_number)
+		return counts
+
+	""" Mean number of secondary infections of the infections which happened in [start, end) (ms; an empirical R) """
+	def reproduction_number(self, start = 0, end = None):
+		time, source, infected, parent, secondary = self.transmission_tree()
+		selected = (time >= start) & (time < end if end is not None else True)
+		return (float)(secondary[selected].mean()) if selected.any() else float('nan')
+
+
+# ======  End of ContactLogReader Class  =======
+
+
+def create_parser():
+	parser = argparse.ArgumentParser(description='Analyze a contact log: transmission tree and secondary infections.')
+	parser.add_argument('log', help='contact log written by headless.py --contact-log')
+	parser.add_argument('--window', type=float, default=10, help='length of the time windows of the empirical R (sec, default: 10)')
+	parser.add_argument('--tree', metavar='FILE', help='write the transmission tree into this CSV file')
+	return parser
+
+def main(argv = None):
+	args = create_parser().parse_args(argv)
+	try:
+		reader = ContactLogReader(args.log)
+	except ValueError as e:
+		print(e, file=sys.stderr)
+		return 1
+	time, source, infected, parent, secondary = reader.transmission_tree()
+	print(f"{len(reader)} events, {len(time)} infections, {(int)(np.count_nonzero(parent < 0))} without a known source")
+	if args.tree:
+		with open(args.tree, 'w') as file:
+			file.write('time,source,infected,parent,secondary\n')
+			for row in zip((time / 1000).tolist(), source.tolist(), infected.tolist(), parent.tolist(), secondary.tolist()):
+				file.write('%.3f,%d,%d,%d,%d\n' % row)
+	# the infections of the last window can still cause infections after the log ends
+	print('window,infections,empirical_r')
+	window = args.window * 1000
+	for start in np.arange(0, (time.max() + 1) if len(time) > 0 else 0, window):
+		selected = (time >= start) & (time < start + window)
+		if selected.any():
+			print(f"{start / 1000:.0f},{(int)(np.count_nonzero(selected))},{secondary[selected].mean():.2f}")
+	return 0
+
+
+# -----------  Start the analysis  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,73 @@
+import numpy as np
+
+""" Pack index pairs into one int64 key per pair (keeps the (i, j) order) """
+def pack_pairs(i, j):
+	return (np.asarray(i, dtype=np.int64) << 32) | np.asarray(j, dtype=np.int64)
+
+""" Index pairs of packed keys """
+def unpack_pairs(keys):
+	return keys >> 32, keys & 0xFFFFFFFF
+
+""" Merge sorted key arrays into one sorted array (pairwise, without sorting again) """
+def merge_sorted(runs):
+	runs = [run for run in runs if len(run) > 0]
+	if not runs:
+		return np.zeros(0, dtype=np.int64)
+	while len(runs) > 1:
+		merged = []
+		for k in range(0, len(runs) - 1, 2):
+			a, b = runs[k], runs[k + 1]
+			# every item of b goes after the items of a which are not greater than it
+			positions = np.searchsorted(a, b, side='right') + np.arange(len(b))
+			result = np.empty(len(a) + len(b), dtype=a.dtype)
+			taken = np.zeros(len(result), dtype=bool)
+			taken[positions] = True
+			result[positions] = b
+			result[~taken] = a
+			merged.append(result)
+		if len(runs) % 2 == 1:
+			merged.append(runs[-1])
+		runs = merged
+	return runs[0]
+
+# ========================================
+# =           ContactSet Class           =
+# ========================================
+
+class ContactSet:
+
+	""" Constructor """
+	def __init__(self, keys = None):
+		self._keys = np.zeros(0, dtype=np.int64) if keys is None else np.array(keys, dtype=np.int64) # sorted packed keys of the pairs in contact
+
+	def __len__(self):
+		return len(self._keys)
+
+	def __contains__(self, pair):
+		key = ((int)(pair[0]) << 32) | (int)(pair[1])
+		position = np.searchsorted(self._keys, key)
+		return position < len(self._keys) and self._keys[position] == key
+
+	""" Replace the pairs in contact with the current ones and tell which of them are new contacts (keys must be sorted) """
+	def update(self, keys):
+		if len(self._keys) == 0:
+			new = np.ones(len(keys), dtype=bool)
+		else:
+			position = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+			new = self._keys[position] != keys
+		self._keys = keys
+		return new
+
+	def clear(self):
+		self._keys = np.zeros(0, dtype=np.int64)
+
+	""" Packed keys of the pairs in contact """
+	def keys(self):
+		return self._keys
+
+	""" Memory used by the contact state (in bytes) """
+	def nbytes(self):
+		return self._keys.nbytes
+
+
+# ======  End of ContactSet Class  =======
@@ -0,0 +1,225 @@
+import math
+from random import Random
+from time import perf_counter
+import numpy as np
+from backends import create_backend
+from contacts import ContactSet, pack_pairs
+from population import Entity, Population
+from profiler import Profiler
+from tracing import Tracer, INFO, VERBOSE
+from spatial import brute_force_pairs
+
+# settings which can be passed to Engine.change_settings
+SETTINGS = (
+	'entity_velocity',
+	'entity_number',
+	'initial_virus_carrier_number',
+	'infection_chance',
+	'healing_time',
+	'immunity_time',
+	'infectious_distance',
+	'timestep',
+)
+
+# ====================================
+# =           Engine Class           =
+# ====================================
+
+class Engine:
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		# debug messages (debugging sets the level of a new tracer, the level of a tracer can be changed later)
+		self.tracer = kwargs['tracer'] if 'tracer' in kwargs else Tracer(level=kwargs['debugging'] if 'debugging' in kwargs else 0)
+		self._spatial_index = kwargs['spatial_index'] if 'spatial_index' in kwargs else True
+		# kernels of the steps (name of a backend of backends.py or a backend object)
+		backend = kwargs['backend'] if 'backend' in kwargs else 'numpy'
+		self.backend = create_backend(backend) if isinstance(backend, str) else backend
+		self.area_size = kwargs['area_size'] if 'area_size' in kwargs else (0, 0)
+		self.random = Random(kwargs['seed'] if 'seed' in kwargs else None) # every random decision of the simulation comes from this
+		self.entities = Population(0)
+		self.time = 0 # in milliseconds
+		self._time_debt = 0 # simulated time requested by advance() but not stepped yet (in milliseconds)
+		self.contacts = ContactSet() # pairs which are within infectious distance right now
+		self.recorder = None # gets every step if set (see recorder.TrajectoryWriter)
+		self.metrics = None # counts every step if set (see metrics.Metrics)
+		self.contact_log = None # gets the contacts and the infections of every step if set (see contactlog.ContactLogWriter)
+		self.profiler = Profiler() # durations of the phases of the steps
+		# simulation settings
+		self.entity_velocity = 20 # in px/seconds
+		self.initial_virus_carrier_number = 2
+		self.entity_number = 100
+		self.infection_chance = 12 # 0-100 %
+		self.healing_time = 12 # in seconds
+		self.immunity_time = 30 # in seconds
+		self.infectious_distance = 10
+		self.timestep = 30 # length of one step in milliseconds
+
+	"""
+	   Generate entities
+	   The carriers are drawn from the engine's random generator and the positions and directions from
+	   a numpy generator seeded by it, so the same seed still generates the same population.
+	"""
+	def populate(self, area_size = None):
+		if area_size is not None:
+			self.area_size = area_size
+		self.reset()
+		n = self.entity_number
+		# raffle infected entities
+		carriers = self.random.sample(range(n), min(self.initial_virus_carrier_number, n))
+		# generate entities
+		generator = np.random.default_rng(self.random.getrandbits(64))
+		x = generator.integers(0, max(self.area_size[0], 1), n).astype(np.float64)
+		y = generator.integers(0, max(self.area_size[1], 1), n).astype(np.float64)
+		direction = generator.uniform(0, math.pi, n)
+		state = np.full(n, Entity.STATE_HEALTHY, dtype=np.int8)
+		state[carriers] = Entity.STATE_INFECTED
+		member_order = np.concatenate([np.flatnonzero(state == s) for s in Entity.STATES])
+		self.entities = Population.restore(x, y, direction, state, np.zeros(n, dtype=np.int64), member_order, self._state_durations())
+		self.trace('Generated %d entities (%d infected)', n, len(carriers))
+		# the list of every entity is only built if it is traced
+		if self.tracer.enabled(VERBOSE):
+			self.trace('Generated entities: %s', ''.join('\n' + str(entity) for entity in self.entities), level=VERBOSE)
+
+	""" Drop every entity and rewind the clock """
+	def reset(self):
+		self.time = 0
+		self._time_debt = 0
+		self.contacts.clear()
+		self.entities = Population(0)
+
+	def change_settings(self, **kwargs):
+		for key in kwargs:
+			if key == 'entity_velocity':
+				self.trace('Changing entity velocity to %s px/sec', kwargs[key])
+				self.entity_velocity = kwargs[key]
+
+			elif key == 'entity_number':
+				self.trace('Changing entity number to %s', kwargs[key])
+				self.entity_number = kwargs[key]
+
+			elif key == 'initial_virus_carrier_number':
+				self.trace('Changing initial virus carrier number to %s', kwargs[key])
+				self.initial_virus_carrier_number = kwargs[key]
+
+			elif key == 'infection_chance':
+				self.trace('Changing infection chance to %s%%', kwargs[key])
+				self.infection_chance = kwargs[key]
+
+			elif key == 'healing_time':
+				self.trace('Changing healing time to %s sec', kwargs[key])
+				self.healing_time = kwargs[key]
+				self.entities.set_durations(self._state_durations())
+
+			elif key == 'immunity_time':
+				self.trace('Changing immunity time to %s sec', kwargs[key])
+				self.immunity_time = kwargs[key]
+				self.entities.set_durations(self._state_durations())
+
+			elif key == 'infectious_distance':
+				self.trace('Changing infectious distance to %s px', kwargs[key])
+				self.infectious_distance = kwargs[key]
+
+			elif key == 'timestep':
+				self.trace('Changing timestep to %s ms', kwargs[key])
+				self.timestep = kwargs[key]
+
+			elif key == 'trace_level':
+				self.tracer.level = kwargs[key]
+				self.trace('Changing trace level to %s', kwargs[key])
+
+	""" Advance the simulation by dt milliseconds """
+	def step(self, dt):
+		entities = self.entities
+		profiler = self.profiler
+		start = perf_counter()
+		# infect new entities
+		first, second = self._find_pairs()
+		# only new contacts can lead to infection, every contact gets one chance while it lasts
+		previous = self.contacts.keys()
+		new = self.contacts.update(pack_pairs(first, second))
+		contacts_done = perf_counter()
+		profiler.add('contacts', contacts_done - start)
+		sources, new_infected_entities = self.backend.infection_candidates(first[new], second[new], entities.state)
+		contact_log = self.contact_log
+		infections = [] # (source, infected) pairs for the contact log
+		for source, i in zip(sources, new_infected_entities):
+			if self.random.randint(0, 100) < self.infection_chance:
+				if contact_log is not None and entities.state[i] == Entity.STATE_HEALTHY:
+					infections.append((source, i))
+				entities.set_state(i, Entity.STATE_INFECTED, self.time)
+		if contact_log is not None:
+			contact_log.record(self.time, previous, self.contacts.keys(), new, infections)
+		infection_done = perf_counter()
+		profiler.add('infection', infection_done - contacts_done)
+		# change entity states if necessary
+		entities.update_states(self.time)
+		states_done = perf_counter()
+		profiler.add('states', states_done - infection_done)
+		# move entities
+		self._move(self.entity_velocity * dt / 1000.0)
+		move_done = perf_counter()
+		profiler.add('move', move_done - states_done)
+		# increase time
+		self.time += dt
+		recorder = self.recorder
+		if recorder is not None:
+			recorder.record(self.time, entities)
+			profiler.add('record', perf_counter() - move_done)
+		profiler.count('steps')
+		profiler.count('entities', len(entities))
+		metrics = self.metrics
+		if metrics is not None:
+			metrics.update(self, perf_counter() - start)
+
+	""" Index pairs (i < j) of the entities within infectious distance, in ascending pair order """
+	def _find_pairs(self):
+		if self._spatial_index:
+			return self.backend.pairs(self.entities.x, self.entities.y, self.infectious_distance)
+		return brute_force_pairs(self.entities.x, self.entities.y, self.infectious_distance)
+
+	""" Move every entity by distance """
+	def _move(self, distance):
+		entities = self.entities
+		self.backend.move(entities.x, entities.y, entities.direction, distance, self.area_size)
+
+	""" Advance the simulation by dt milliseconds in fixed timesteps, doing at most max_steps steps (the time which does not fit is dropped); returns the number of steps """
+	def advance(self, dt, max_steps = None):
+		self._time_debt += dt
+		steps = (int)(self._time_debt // self.timestep)
+		if max_steps is not None and steps > max_steps:
+			steps = max_steps
+			self._time_debt = steps * self.timestep
+		for i in range(steps):
+			self.step(self.timestep)
+		self._time_debt -= steps * self.timestep
+		return steps
+
+	""" Step the simulation until the clock reaches t (in milliseconds) """
+	def run_until(self, t):
+		while self.time < t:
+			self.step(self.timestep)
+
+	""" Infect a healthy entity (if there is any) """
+	def infect_random_entity(self):
+		i = self.entities.sample(Entity.STATE_HEALTHY, self.random)
+		if i is not None:
+			self.entities.set_state(i, Entity.STATE_INFECTED, self.time)
+			if self.contact_log is not None:
+				self.contact_log.record_infection(self.time, i)
+
+	""" Number of healthy, infected and immune entities """
+	def count_states(self):
+		return self.entities.counts()
+
+	""" How long the infected and the immune state lasts (in milliseconds) """
+	def _state_durations(self):
+		return {Entity.STATE_INFECTED: self.healing_time * 1000, Entity.STATE_IMMUNE: self.immunity_time * 1000}
+
+	""" Trace a debug message (formatted with the args only if the level is traced) """
+	def trace(self, message, *args, level = INFO, source = None):
+		if level <= self.tracer.level:
+			self.tracer.trace(level, source if source is not None else type(self).__name__, message, args)
+
+
+# ======  End of Engine Class  =======
@@ -0,0 +1,158 @@
+#!/usr/bin/python3.7
+import argparse, multiprocessing, os, sys
+import numpy as np
+from engine import Engine
+import headless
+
+""" Independent seeds of the replicas derived from one base seed """
+def replica_seeds(base_seed, replicas):
+	seeds = []
+	for child in np.random.SeedSequence(base_seed).spawn(replicas):
+		high, low = child.generate_state(2, dtype=np.uint64)
+		seeds.append(((int)(high) << 64) | (int)(low))
+	return seeds
+
+""" Run one replica and return its infected and immune counts at every sample (executed in the worker processes) """
+def run_replica(job):
+	seed, options = job
+	engine = Engine(area_size=options['area_size'], seed=seed)
+	engine.change_settings(**options['settings'])
+	engine.populate()
+	infected = []
+	immune = []
+	def report(time, healthy_count, infected_count, immune_count):
+		infected.append(infected_count)
+		immune.append(immune_count)
+	headless.run(engine, argparse.Namespace(**options['run']), report)
+	return np.array(infected, dtype=np.int64), np.array(immune, dtype=np.int64)
+
+# ===================================
+# =           Bands Class           =
+# ===================================
+
+class Bands:
+
+	""" Constructor (samples: length of the time series, population: maximum value of a sample) """
+	def __init__(self, samples, population, **kwargs):
+		self._population = max(population, 1)
+		self._bins = min(self._population + 1, kwargs['max_bins'] if 'max_bins' in kwargs else 1001)
+		self._histogram = np.zeros((samples, self._bins), dtype=np.int32)
+		self._sum = np.zeros(samples, dtype=np.float64)
+		self.count = 0
+
+	""" Add a replica's time series and forget it """
+	def add(self, series):
+		series = np.asarray(series)
+		bins = (series * (self._bins - 1) + self._population // 2) // self._population
+		self._histogram[np.arange(len(series)), bins] += 1
+		self._sum[:len(series)] += series
+		self.count += 1
+
+	""" Mean of the replicas at every sample """
+	def mean(self):
+		return self._sum / max(self.count, 1)
+
+	""" Percentile (0-100) of the replicas at every sample """
+	def percentile(self, q):
+		cumulative = np.cumsum(self._histogram, axis=1)
+		rank = np.maximum(np.ceil(q / 100.0 * self.count), 1)
+		bins = np.argmax(cumulative >= rank, axis=1)
+		return bins * self._population / (self._bins - 1)
+
+
+# ======  End of Bands Class  =======
+
+
+# ======================================
+# =           Ensemble Class           =
+# ======================================
+
+class Ensemble:
+
+	""" Constructor """
+	def __init__(self, replicas, **kwargs):
+		self._seeds = replica_seeds(kwargs['seed'] if 'seed' in kwargs else 0, replicas)
+		self._processes = kwargs['processes'] if 'processes' in kwargs else os.cpu_count()
+		self._settings = kwargs['settings'] if 'settings' in kwargs else {}
+		self._area_size = kwargs['area_size'] if 'area_size' in kwargs else (330, 230)
+		self._run = {
+			'duration': kwargs['duration'] if 'duration' in kwargs else 600,
+			'sample_interval': kwargs['sample_interval'] if 'sample_interval' in kwargs else 1,
+		}
+		self.entity_number = self._settings['entity_number'] if 'entity_number' in self._settings else Engine().entity_number
+		self.infected = None
+		self.immune = None
+
+	""" Seeds of the replicas """
+	@property
+	def seeds(self):
+		return list(self._seeds)
+
+	""" Run the replicas in parallel, folding every finished replica into the bands """
+	def run(self, progress = None):
+		jobs = [(seed, {'settings': self._settings, 'area_size': self._area_size, 'run': self._run}) for seed in self._seeds]
+		with multiprocessing.Pool(self._processes) as pool:
+			for done, (infected, immune) in enumerate(pool.imap_unordered(run_replica, jobs), 1):
+				if self.infected is None:
+					self.infected = Bands(len(infected), self.entity_number)
+					self.immune = Bands(len(immune), self.entity_number)
+				self.infected.add(infected)
+				self.immune.add(immune)
+				if progress is not None:
+					progress(done, len(jobs))
+
+	""" Sample times (in seconds) """
+	def times(self):
+		samples = len(self.infected.mean()) if self.infected is not None else 0
+		return [i * self._run['sample_interval'] for i in range(samples)]
+
+
+# ======  End of Ensemble Class  =======
+
+
+def create_parser():
+	parser = argparse.ArgumentParser(description='Run independently seeded replicas of a configuration and aggregate their curves.')
+	headless.add_settings_arguments(parser)
+	parser.add_argument('--replicas', '-n', type=int, default=32, help='number of replicas (default: 32)')
+	parser.add_argument('--seed', type=int, default=0, help='base seed of the replica seeds (default: 0)')
+	parser.add_argument('--percentiles', default='5,50,95', help='percentile bands in the output (default: 5,50,95)')
+	parser.add_argument('--sample-interval', type=float, default=1, help='time between the samples (sec, default: 1)')
+	parser.add_argument('--processes', type=int, default=os.cpu_count(), help='number of worker processes (default: number of cores)')
+	parser.add_argument('--output', '-o', help='write the bands into this CSV file instead of the standard output')
+	return parser
+
+def main(argv = None):
+	args = create_parser().parse_args(argv)
+	percentiles = [float(q) for q in args.percentiles.split(',')]
+	ensemble = Ensemble(
+		args.replicas,
+		seed=args.seed,
+		processes=args.processes,
+		settings=headless.settings_from_args(args),
+		area_size=args.area_size,
+		duration=args.duration,
+		sample_interval=args.sample_interval,
+	)
+	def progress(done, total):
+		print(f"[{done}/{total}] replicas finished", file=sys.stderr)
+	ensemble.run(progress)
+	columns = []
+	for name, bands in (('infected', ensemble.infected), ('immune', ensemble.immune)):
+		columns.append((name + '_mean', bands.mean() / ensemble.entity_number * 100))
+		for q in percentiles:
+			columns.append((f"{name}_p{q:g}", bands.percentile(q) / ensemble.entity_number * 100))
+	output = open(args.output, 'w') if args.output else sys.stdout
+	try:
+		output.write(','.join(['time'] + [name for name, values in columns]) + '\n')
+		for i, time in enumerate(ensemble.times()):
+			output.write(','.join([f"{time:.3f}"] + [f"{values[i]:.2f}" for name, values in columns]) + '\n')
+	finally:
+		if output is not sys.stdout:
+			output.close()
+	return 0
+
+
+# -----------  Start the ensemble  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
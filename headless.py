@@ -0,0 +1,157 @@
+#!/usr/bin/python3.7
+import argparse, math, sys
+from engine import Engine, SETTINGS
+from parallel import ParallelEngine
+from contactlog import ContactLogWriter
+from recorder import TrajectoryWriter
+from tracing import Tracer
+import checkpoint
+
+""" Parse 'WIDTHxHEIGHT' """
+def area_size(value):
+	try:
+		width, height = value.lower().split('x')
+		return ((int)(width), (int)(height))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"invalid area size: '{value}' (expected WIDTHxHEIGHT)")
+
+""" Parse a positive integer (e.g. a timestep: a step of no time would never end a run) """
+def positive_int(value):
+	try:
+		number = (int)(value)
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+	if number <= 0:
+		raise argparse.ArgumentTypeError(f"must be greater than 0: '{value}'")
+	return number
+
+""" Arguments of the simulation settings (shared with the other command line tools) """
+def add_settings_arguments(parser):
+	parser.add_argument('--entity-velocity', type=float, help='velocity of the entities (px/sec)')
+	parser.add_argument('--entity-number', type=int, help='number of entities')
+	parser.add_argument('--initial-virus-carrier-number', type=int, help='number of the initially infected entities')
+	parser.add_argument('--infection-chance', type=int, help='chance of infection on contact (0-100 %%)')
+	parser.add_argument('--healing-time', type=int, help='healing time (sec)')
+	parser.add_argument('--immunity-time', type=int, help='immunity time (sec)')
+	parser.add_argument('--infectious-distance', type=int, help='infectious distance (px)')
+	parser.add_argument('--area-size', type=area_size, default=(330, 230), help='size of the livable area in px (default: 330x230)')
+	parser.add_argument('--timestep', type=positive_int, help='length of a simulation step (ms)')
+	parser.add_argument('--duration', type=float, default=600, help='simulated time to run (sec, default: 600)')
+
+def create_parser():
+	parser = argparse.ArgumentParser(description='Run the herd immunity simulation without a display, as fast as possible.')
+	add_settings_arguments(parser)
+	parser.add_argument('--sample-interval', type=float, default=1, help='time between the rows of the output (sec, default: 1)')
+	parser.add_argument('--backend', default='numpy', help='kernels of the steps: python, numpy, numba or auto (default: numpy)')
+	parser.add_argument('--processes', type=int, default=1, help='step the simulation in this many worker processes (the results are the same, default: 1)')
+	parser.add_argument('--seed', type=int, help='seed of the random number generator (the same seed reproduces the same run)')
+	parser.add_argument('--record', metavar='FILE', help='record the trajectories of the entities into this file')
+	parser.add_argument('--record-interval', type=int, default=100, help='simulated time between the recorded frames (ms, default: 100)')
+	parser.add_argument('--key-frame-interval', type=int, default=1, help='record a full frame in every N frames and position deltas in the others (default: 1, no deltas)')
+	parser.add_argument('--contact-log', metavar='FILE', help='log the contacts and the infections into this file (see contactlog.py; with --resume an existing log is continued from the checkpoint)')
+	parser.add_argument('--infections-only', action='store_true', help='log only the infections into the contact log')
+	parser.add_argument('--checkpoint', metavar='FILE', help='save the complete state of the simulation into this file periodically and at the end')
+	parser.add_argument('--checkpoint-every', type=float, default=60, help='simulated time between the checkpoints (sec, default: 60)')
+	parser.add_argument('--resume', metavar='FILE', help='continue the simulation from a checkpoint (the settings and the seed given here fork the run)')
+	parser.add_argument('--profile', metavar='FILE', help='write the timings of the simulation phases into this CSV (or .json) file at the end')
+	parser.add_argument('--metrics-port', type=int, help='serve the metrics of the run in the Prometheus format on http://127.0.0.1:PORT/metrics')
+	parser.add_argument('--mean-field', action='store_true', help='add the mean-field estimate of the curves to the output (mf_healthy, mf_infected, mf_immune)')
+	parser.add_argument('--output', '-o', help='write the S/I/R curves into this CSV file instead of the standard output')
+	parser.add_argument('--debug', action='count', default=0, help='print debug messages (twice for verbose messages)')
+	parser.add_argument('--trace', metavar='FILE', help='write the debug messages into this file instead of the standard output')
+	return parser
+
+""" Settings given on the command line """
+def settings_from_args(args):
+	return {key: getattr(args, key) for key in SETTINGS if getattr(args, key) is not None}
+
+""" Run the simulation, calling report(time, healthy, infected, immune) at every sample """
+def run(engine, args, report):
+	sample_interval = args.sample_interval * 1000
+	end = args.duration * 1000
+	# a resumed run continues after the sample which was reported when its checkpoint was taken
+	next_sample = (math.floor(engine.time / sample_interval) + 1) * sample_interval if engine.time > 0 else 0
+	while True:
+		if engine.time >= next_sample:
+			report(engine.time, *engine.count_states())
+			next_sample += sample_interval
+		if engine.time >= end:
+			break
+		engine.run_until(min(next_sample, end))
+
+def main(argv = None):
+	args = create_parser().parse_args(argv)
+	tracer = Tracer(level=args.debug, path=args.trace)
+	if args.processes > 1:
+		create_engine = lambda **kwargs: ParallelEngine(processes=args.processes, backend=args.backend, **kwargs)
+	else:
+		create_engine = lambda **kwargs: Engine(backend=args.backend, **kwargs)
+	if args.resume:
+		engine = checkpoint.load(args.resume, create_engine(tracer=tracer))
+		if args.seed is not None:
+			engine.random.seed(args.seed)
+		engine.change_settings(**settings_from_args(args))
+	else:
+		engine = create_engine(tracer=tracer, area_size=args.area_size, seed=args.seed)
+		engine.change_settings(**settings_from_args(args))
+		engine.populate()
+	if args.record:
+		engine.recorder = TrajectoryWriter(args.record, len(engine.entities), engine.area_size, interval=args.record_interval, key_frame_interval=args.key_frame_interval)
+		engine.recorder.record(engine.time, engine.entities)
+	if args.contact_log:
+		# a resumed run continues its log: the events after the checkpoint are replaced, the initial carriers are not logged again
+		engine.contact_log = ContactLogWriter(args.contact_log, len(engine.entities), contacts=not args.infections_only, population=engine.entities, time=engine.time, append=bool(args.resume))
+	server = None
+	if args.metrics_port is not None:
+		from metrics import Metrics, MetricsServer
+		engine.metrics = Metrics()
+		server = MetricsServer(engine.metrics, port=args.metrics_port)
+	output = open(args.output, 'w') if args.output else sys.stdout
+	try:
+		estimate = None
+		if args.mean_field:
+			from meanfield import MeanField
+			# the estimate starts from the initial carriers at time 0, like the run which is (or was) resumed
+			estimate = MeanField.from_engine(engine)
+		output.write('time,healthy,infected,immune' + (',mf_healthy,mf_infected,mf_immune' if estimate is not None else '') + '\n')
+		next_checkpoint = engine.time + args.checkpoint_every * 1000
+		def report(time, healthy, infected, immune):
+			nonlocal next_checkpoint
+			if estimate is not None:
+				expected = ','.join(f"{count:.2f}" for count in estimate.at(time))
+				output.write(f"{time / 1000:.3f},{healthy},{infected},{immune},{expected}\n")
+			else:
+				output.write(f"{time / 1000:.3f},{healthy},{infected},{immune}\n")
+			# checkpoints are taken at the samples, so a resumed run continues the output without a gap
+			if args.checkpoint and time >= next_checkpoint:
+				output.flush()
+				if engine.contact_log is not None:
+					engine.contact_log.flush()
+				checkpoint.save(engine, args.checkpoint)
+				next_checkpoint += args.checkpoint_every * 1000
+		run(engine, args, report)
+		if args.checkpoint:
+			if engine.contact_log is not None:
+				engine.contact_log.flush()
+			checkpoint.save(engine, args.checkpoint)
+		if args.profile:
+			engine.profiler.export(args.profile)
+	finally:
+		if output is not sys.stdout:
+			output.close()
+		if engine.recorder is not None:
+			engine.recorder.close()
+		if engine.contact_log is not None:
+			engine.contact_log.close()
+		if isinstance(engine, ParallelEngine):
+			engine.close()
+		if server is not None:
+			server.close()
+		tracer.close()
+	return 0
+
+
+# -----------  Start the simulation  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,129 @@
+import threading
+import numpy as np
+
+"""
+   Bounded history of the shares of the states.
+   The samples go into levels of buckets: a bucket of level k holds the minimum and the maximum share
+   of every state over 2^k samples and a level keeps its last capacity buckets in a ring. The top level
+   never drops a bucket, it merges its buckets pairwise when it is full instead. The finest level which
+   still holds the whole run has at most capacity buckets, so the memory and the cost of drawing the
+   history do not grow with the length of the run.
+"""
+
+# ===================================
+# =           Level Class           =
+# ===================================
+
+class Level:
+
+	""" Constructor (capacity buckets of width samples each) """
+	def __init__(self, capacity, width, compacting = False):
+		self.width = width
+		self._compacting = compacting
+		self.start = np.zeros(capacity, dtype=np.float64) # time of the first and the last sample of a bucket (in milliseconds)
+		self.end = np.zeros(capacity, dtype=np.float64)
+		self.low = np.zeros((capacity, 3), dtype=np.float64) # minimum and maximum shares of the healthy, infected and immune entities
+		self.high = np.zeros((capacity, 3), dtype=np.float64)
+		self.count = 0 # buckets completed so far (the last capacity of them are kept)
+		self._pending = None # [start, end, low, high, samples] of the bucket being filled
+
+	def add(self, time, shares):
+		pending = self._pending
+		if pending is None:
+			pending = self._pending = [time, time, list(shares), list(shares), 0]
+		else:
+			pending[1] = time
+			pending[2] = [min(a, b) for a, b in zip(pending[2], shares)]
+			pending[3] = [max(a, b) for a, b in zip(pending[3], shares)]
+		pending[4] += 1
+		if pending[4] >= self.width:
+			if self._compacting and self.count == len(self.start):
+				self._compact()
+			i = self.count % len(self.start)
+			self.start[i], self.end[i], self.low[i], self.high[i] = pending[0], pending[1], pending[2], pending[3]
+			self.count += 1
+			self._pending = None
+
+	""" Merge the buckets pairwise (only a compacting level is full, it never wraps around) """
+	def _compact(self):
+		half = self.count // 2
+		self.start[:half] = self.start[0:2 * half:2]
+		self.end[:half] = self.end[1:2 * half:2]
+		self.low[:half] = np.minimum(self.low[0:2 * half:2], self.low[1:2 * half:2])
+		self.high[:half] = np.maximum(self.high[0:2 * half:2], self.high[1:2 * half:2])
+		self.count = half
+		self.width *= 2
+
+	""" Whether every completed bucket since the start is still kept """
+	def complete(self):
+		return self.count <= len(self.start)
+
+	""" Copies of the buckets first, first + 1, ... (global indices, the ones which are not kept any more are skipped) """
+	def buckets(self, first):
+		capacity = len(self.start)
+		first = max(first, self.count - capacity, 0)
+		order = np.arange(first, self.count) % capacity
+		return first, self.start[order], self.end[order], self.low[order], self.high[order]
+
+
+# ======  End of Level Class  =======
+
+
+# =====================================
+# =           History Class           =
+# =====================================
+
+class History:
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		self.capacity = kwargs['capacity'] if 'capacity' in kwargs else 512 # buckets per level
+		self._level_number = kwargs['levels'] if 'levels' in kwargs else 8
+		self._lock = threading.Lock() # the simulation thread adds, the window reads
+		self.version = 0 # changes whenever buckets change in place (clear, compaction)
+		self.clear()
+
+	""" Forget every sample """
+	def clear(self):
+		with self._lock:
+			self._levels = [Level(self.capacity, 2 ** k, k == self._level_number - 1) for k in range(self._level_number)]
+			self.samples = 0
+			self.version += 1
+
+	""" Add the counts of the states at a time (in milliseconds) """
+	def add(self, time, healthy, infected, immune):
+		count = healthy + infected + immune
+		if count == 0:
+			return
+		shares = (healthy / count, infected / count, immune / count)
+		with self._lock:
+			top = self._levels[-1]
+			width = top.width
+			for level in self._levels:
+				level.add(time, shares)
+			if top.width != width:
+				self.version += 1
+			self.samples += 1
+
+	""" Index of the finest level which holds the whole history and the version of the buckets """
+	def view(self):
+		with self._lock:
+			for k, level in enumerate(self._levels):
+				if level.complete():
+					return k, self.version
+
+	"""
+	   Buckets of a level from the global index first on: (first kept index, start, end, low, high)
+	   start and end are the times of the buckets, low and high the minimum and maximum shares of the states.
+	"""
+	def buckets(self, level, first = 0):
+		with self._lock:
+			return self._levels[level].buckets(first)
+
+	""" Number of completed buckets of a level """
+	def count(self, level):
+		with self._lock:
+			return self._levels[level].count
+
+
+# ======  End of History Class  =======
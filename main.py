@@ -1,156 +1,146 @@
 #!/usr/bin/python3.7
-import gi, math, cairo, threading, time
+import argparse, collections, gi, cairo, math, threading, time
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gio, Gdk, GLib
-from random import *
-from datetime import datetime
+from chart import Chart
+from engine import Engine
+from history import History
+from meanfield import MeanField
+from metrics import Metrics, MetricsServer
+from population import Entity
+from recorder import TrajectoryReader, TrajectoryWriter
+from renderer import Renderer
+from snapshot import SnapshotBuffer
+from tracing import Tracer, INFO, VERBOSE
 
 # ==========================================
 # =           HerdImmunity Class           =
 # ==========================================
 
-class HerdImmunity:
+class HerdImmunity(Engine):
 
 	""" Constructor """
 	def __init__(self, **kwargs):
+		super(HerdImmunity, self).__init__(**kwargs)
 		self.version = kwargs['version'] if 'version' in kwargs else '0.0.0'
-		self._debugging = kwargs['debugging'] if 'debugging' in kwargs else False
-		self.area_size = (0, 0)
 		self.speed_ratio = 1
-		self.entities = []
-		# simulation settings
-		self.entity_velocity = 20 # in px/seconds
-		self.initial_virus_carrier_number = 2
-		self.entity_number = 100
-		self.infection_chance = 12 # 0-100 %
-		self.healing_time = 12 # in seconds
-		self.immunity_time = 30 # in seconds
-		self.infectious_distance = 10
+		self.as_fast_as_possible = False
+		self._record_path = None
+		self.snapshots = SnapshotBuffer() # the state of the simulation as the window sees it
+		self.mean_field = None # mean-field estimate of the running simulation (for comparison)
+		self.history = History() # shares of the states over the run, sampled at every tick
+		self._main_thread = None
+		self._metrics_port = kwargs['metrics_port'] if 'metrics_port' in kwargs else None # serve the metrics on this loopback port if set
+		self._metrics_server = None
 
 	""" Main entry point """
 	def run_app(self):
-		self.print_debug('Running app...')
-		self._window = MainWindow(self, debugging=1)
+		self.trace('Running app...')
+		self._window = MainWindow(self)
 		self._window.connect('delete-event', self.stop_app)
 		self._window.show_all()
 		self._window.init()
-		self._main_thread = MainThread(self, tick=30, debugging=1)
+		if self._metrics_port is not None:
+			self.metrics = Metrics()
+			self._metrics_server = MetricsServer(self.metrics, port=self._metrics_port)
+			self.trace('Serving metrics on http://%s:%d/metrics', *self._metrics_server.address)
+		self._main_thread = MainThread(self, tick=30)
 		self._main_thread.start()
-		self.print_debug('Executing Gtk.main()...')
+		self.trace('Executing Gtk.main()...')
 		Gtk.main()
 
 	""" Main exit point """
 	def stop_app(self, window = None, event = None):
-		self.print_debug('Stopping app...')
+		self.trace('Stopping app...')
 		self._main_thread.stop()
+		self._main_thread.join()
+		if self._metrics_server is not None:
+			self._metrics_server.close()
 		Gtk.main_quit()
+		self.tracer.close()
 
-	""" Simulation controllers """
+	"""
+	   Simulation controllers
+	   They only send commands to the simulation thread, which applies them in order; the state of
+	   the simulation is changed by that thread alone.
+	"""
 	def start_simulation(self):
-		self.print_debug('Starting simulation...')
-		"""
-		   Generating entities
-		"""
-		# raffle infected entities
-		infected_entities = []
-		for i in range(self.initial_virus_carrier_number):
-			index = randint(1, self.entity_number) - 1
-			while index in infected_entities:
-				index += 1
-			infected_entities.append(index)
-		# request area size
-		self.area_size = self._window.get_area_size()
-		# generate entities
-		self.entities = []
-		for i in range(self.entity_number):
-			is_infected = i in infected_entities
-			position = (randint(0, self.area_size[0] - 1), randint(0, self.area_size[1] - 1))
-			direction = uniform(0, math.pi)
-			entity = self.Entity(i, is_infected, position, direction)
-			self.entities.append(entity)
-		# print entities to debug console
-		debug_output = 'Generated entities: '
-		for entity in self.entities:
-			debug_output += '\n' + str(entity)
-		self.print_debug(debug_output)
-		"""
-			Starting thread
-		"""
-		self._main_thread.s_start()
+		self.trace('Starting simulation...')
+		self._main_thread.s_start(self._window.get_area_size())
 
 	def pause_simulation(self):
-		self.print_debug('Simulation paused')
+		self.trace('Simulation paused')
 		self._main_thread.s_pause()
 
 	def continue_simulation(self):
-		self.print_debug('Continue simulation...')
+		self.trace('Continue simulation...')
 		self._main_thread.s_continue()
 
 	def stop_simulation(self):
-		self.print_debug('Stopping simulation...')
+		self.trace('Stopping simulation...')
+		self.stop_recording()
 		self._main_thread.s_stop()
 
+	""" Generate the entities of a new simulation (called by the simulation thread) """
+	def prepare_simulation(self, area_size):
+		self.populate(area_size)
+		self.history.clear()
+		self.mean_field = MeanField.from_engine(self)
+		# the window only interpolates the curve, it is computed (and extended) by the simulation thread
+		self.mean_field.prepare(0)
+		self.trace('Mean-field estimate: R0=%.2f', self.mean_field.reproduction_number())
+		if self._record_path is not None:
+			self._attach_recorder()
+
+	""" Recording controllers """
+	def start_recording(self, path):
+		self.trace('Recording into %s', path)
+		self._main_thread.s_run(self._start_recording, path)
+
+	def stop_recording(self):
+		self._main_thread.s_run(self._stop_recording)
+
+	def _start_recording(self, path):
+		self._record_path = path
+		if len(self.entities) > 0:
+			self._attach_recorder()
+
+	def _stop_recording(self):
+		self._record_path = None
+		recorder = self.recorder
+		self.recorder = None
+		if recorder is not None:
+			recorder.close()
+			self.trace('Recording stopped after %d frames', recorder.frames)
+
+	def _attach_recorder(self):
+		recorder = TrajectoryWriter(self._record_path, len(self.entities), self.area_size)
+		recorder.record(self.time, self.entities)
+		self.recorder = recorder
+
+	""" Change the settings in order with the other commands (directly while the simulation thread does not run) """
 	def change_settings(self, **kwargs):
-		for key in kwargs:
-			if key == 'speed_ratio':
-				self.print_debug('Changing simulation speed to ' + str(kwargs[key]) + 'x')
-				self.speed_ratio = kwargs[key]
-
-			elif key == 'entity_velocity':
-				self.print_debug('Changing entity velocity to ' + str(kwargs[key]) + ' px/sec')
-				self.entity_velocity = kwargs[key]
-
-			elif key == 'entity_number':
-				self.print_debug('Changing entity number to ' + str(kwargs[key]))
-				self.entity_number = kwargs[key]
-
-			elif key == 'initial_virus_carrier_number':
-				self.print_debug('Changing initial virus carrier number to ' + str(kwargs[key]))
-				self.initial_virus_carrier_number = kwargs[key]
-
-			elif key == 'infection_chance':
-				self.print_debug('Changing infection chance to ' + str(kwargs[key]) + '%')
-				self.infection_chance = kwargs[key]
-
-			elif key == 'healing_time':
-				self.print_debug('Changing healing time to ' + str(kwargs[key]) + ' sec')
-				self.healing_time = kwargs[key]
-
-			elif key == 'immunity_time':
-				self.print_debug('Changing immunity time to ' + str(kwargs[key]) + ' sec')
-				self.immunity_time = kwargs[key]
+		if self._main_thread is not None and self._main_thread.is_alive() and threading.current_thread() is not self._main_thread:
+			self._main_thread.s_run(self._apply_settings, kwargs)
+		else:
+			self._apply_settings(kwargs)
 
-			elif key == 'infectious_distance':
-				self.print_debug('Changing infectious distance to ' + str(kwargs[key]) + ' px')
-				self.infectious_distance = kwargs[key]
+	def _apply_settings(self, kwargs):
+		if 'speed_ratio' in kwargs:
+			self.trace('Changing simulation speed to %sx', kwargs['speed_ratio'])
+			self.speed_ratio = kwargs['speed_ratio']
+		if 'as_fast_as_possible' in kwargs:
+			self.trace('Running as fast as possible: %s', kwargs['as_fast_as_possible'])
+			self.as_fast_as_possible = kwargs['as_fast_as_possible']
+		super(HerdImmunity, self).change_settings(**kwargs)
 
 	def infect_random(self):
 		self._main_thread.s_infect_random()
 
+	""" Publish the current state for the window and ask for a frame (called by the simulation thread) """
 	def refresh_simulation_area(self, time):
-		Gdk.threads_add_idle(GLib.PRIORITY_DEFAULT_IDLE, self._window.render_area)
-		Gdk.threads_add_idle(GLib.PRIORITY_DEFAULT_IDLE, self._window.display_info, time)
-
-	""" Entity class """
-	class Entity:
-		STATE_HEALTHY = 1
-		STATE_INFECTED = 2
-		STATE_IMMUNE = 3
-
-		def __init__(self, index, infected, position, direction):
-			self.id = index
-			self.state = self.STATE_INFECTED if infected else self.STATE_HEALTHY
-			self.position = ((float)(position[0]), (float)(position[1])) # (x, y)
-			self.direction = (float)(direction) # 0-2π
-			self.state_time = 0 # in milliseconds
-
-		def __str__(self):
-			return f"{{id: {self.id}, state: {self.state}, position: {self.position}, direction: {self.direction}, state_time: {self.state_time}}}"
-
-	""" Print debug message """
-	def print_debug(self, text):
-		if self._debugging:
-			print('[' + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + '] ' + text)
+		self.snapshots.publish(time, self.entities)
+		self._window.request_frame(time)
 
 
 # ======  End of HerdImmunity Class  =======
@@ -165,8 +155,7 @@ class MainWindow(Gtk.Window):
 	""" Constructor """
 	def __init__(self, herdimmunity, **kwargs):
 		self._herdimmunity = herdimmunity
-		self._debugging = kwargs['debugging'] if 'debugging' in kwargs else 0
-		self.print_debug('Preparing main window...')
+		self.trace('Preparing main window...')
 		Gtk.Window.__init__(self)
 		self.set_default_size(600, 300)
 		self.set_resizable(True)
@@ -215,13 +204,51 @@ class MainWindow(Gtk.Window):
 
 		header_bar.pack_end(self._properties_button)
 
+		# Replay button
+		self._replay_button = Gtk.ToggleButton()
+		image = Gtk.Image.new_from_gicon(Gio.ThemedIcon(name='document-open'), Gtk.IconSize.BUTTON)
+		self._replay_button.add(image)
+
+		header_bar.pack_end(self._replay_button)
+
+		# Record button
+		self._record_button = Gtk.ToggleButton()
+		image = Gtk.Image.new_from_gicon(Gio.ThemedIcon(name='media-record'), Gtk.IconSize.BUTTON)
+		self._record_button.add(image)
+
+		header_bar.pack_end(self._record_button)
+
+		# Profiler overlay button
+		self._profiler_button = Gtk.ToggleButton()
+		image = Gtk.Image.new_from_gicon(Gio.ThemedIcon(name='utilities-system-monitor'), Gtk.IconSize.BUTTON)
+		self._profiler_button.add(image)
+
+		header_bar.pack_end(self._profiler_button)
+
 		# -----------  Window content  -----------
 
 		box = Gtk.Box(margin=20)
 
 		# Drawing area
+		area_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+		overlay = Gtk.Overlay()
 		self._drawing_area = Gtk.DrawingArea()
 		self._drawing_area.set_size_request(360, 260)
+		overlay.add(self._drawing_area)
+		area_box.pack_start(overlay, True, True, 0)
+
+		# Profiler overlay
+		self._profiler_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, halign=Gtk.Align.START, valign=Gtk.Align.START, margin=15)
+		self._profiler_label = Gtk.Label()
+		self._profiler_box.pack_start(self._profiler_label, False, False, 0)
+		self._profiler_export_button = Gtk.Button(label='Exportálás')
+		self._profiler_box.pack_start(self._profiler_export_button, False, False, 0)
+		overlay.add_overlay(self._profiler_box)
+
+		# Replay position
+		self._replay_scale = Gtk.Scale.new_with_range(Gtk.Orientation.HORIZONTAL, 0, 1, 1)
+		self._replay_scale.set_draw_value(False)
+		area_box.pack_start(self._replay_scale, False, False, 0)
 
 		# Information box
 		info_area = Gtk.Box(width_request=180, orientation=Gtk.Orientation.VERTICAL, margin=10)
@@ -247,7 +274,25 @@ class MainWindow(Gtk.Window):
 		label_box.pack_end(self._immunity_label, False, False, 0)
 		info_area.pack_start(label_box, False, False, 0)
 
-		box.pack_start(self._drawing_area, True, True, 0)
+		label_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
+		label_box.pack_start(Gtk.Label(label='Becslés (átlagtér): '), False, False, 0)
+		self._estimate_label = Gtk.Label()
+		self._estimate_label.set_markup("<span face='Monospace'>-</span>")
+		label_box.pack_end(self._estimate_label, False, False, 0)
+		info_area.pack_start(label_box, False, False, 0)
+
+		label_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
+		label_box.pack_start(Gtk.Label(label='Rajzolási idő: '), False, False, 0)
+		self._frame_time_label = Gtk.Label()
+		self._frame_time_label.set_markup("<span face='Monospace'>-</span>")
+		label_box.pack_end(self._frame_time_label, False, False, 0)
+		info_area.pack_start(label_box, False, False, 0)
+
+		# Epidemic curve
+		self._chart_area = Gtk.DrawingArea(height_request=120, margin_top=10)
+		info_area.pack_start(self._chart_area, False, False, 0)
+
+		box.pack_start(area_box, True, True, 0)
 		box.pack_start(info_area, False, False, 0)
 		self.add(box)
 
@@ -257,20 +302,35 @@ class MainWindow(Gtk.Window):
 
 		# -----------  Register events  -----------
 
+		self._drawing_area.add_events(Gdk.EventMask.BUTTON_PRESS_MASK | Gdk.EventMask.POINTER_MOTION_MASK | Gdk.EventMask.SCROLL_MASK)
 		self._drawing_area.connect('draw', self._draw)
+		self._chart_area.connect('draw', self._draw_chart)
+		self._drawing_area.connect('scroll-event', self._zoom)
+		self._drawing_area.connect('button-press-event', self._area_button_press)
+		self._drawing_area.connect('motion-notify-event', self._pan)
 		self._start_button.connect('clicked', self._start)
 		self._pause_button.connect('clicked', self._pause)
 		self._speedup_button.connect('clicked', self._speedup)
 		self._stop_button.connect('clicked', self._stop)
 		self._properties_button.connect('clicked', self._properties)
 		self._infect_random_button.connect('clicked', self._infect_random)
+		self._record_button.connect('toggled', self._record)
+		self._replay_button.connect('toggled', self._replay)
+		self._replay_scale.connect('value-changed', self._replay_seek)
+		self._profiler_button.connect('toggled', self._toggle_profiler)
+		self._profiler_export_button.connect('clicked', self._export_profile)
 
 	""" Initialize window (after shown) """
 	def init(self):
-		self.print_debug('Initializing window...')
+		self.trace('Initializing window...')
 		self._stop_button.hide()
 		self._pause_button.set_sensitive(False)
 		self._speedup_button.set_sensitive(False)
+		self._replay_scale.hide()
+		self._profiler_box.hide()
+		self._profiler_update_time = 0
+		self._trajectory = None
+		self._replay_frame = None
 		self._zero_infection_reached = False
 		self._pause_on_zero_infection = False
 		self._speedup_ratio = 5
@@ -278,71 +338,125 @@ class MainWindow(Gtk.Window):
 		self._border_width = 10
 		self._entity_radius = 5
 		self._entity_color = {
-			HerdImmunity.Entity.STATE_HEALTHY: (0, 1, 0),
-			HerdImmunity.Entity.STATE_INFECTED: (1, 0, 0),
-			HerdImmunity.Entity.STATE_IMMUNE: (0, 0, 1),
+			Entity.STATE_HEALTHY: (0, 1, 0),
+			Entity.STATE_INFECTED: (1, 0, 0),
+			Entity.STATE_IMMUNE: (0, 0, 1),
 		}
+		self._renderer = Renderer(
+			border_color=self._border_color,
+			border_width=self._border_width,
+			entity_radius=self._entity_radius,
+			entity_color=self._entity_color,
+		)
+		self._chart = Chart(entity_color=self._entity_color)
+		self._frame_scheduler = FrameScheduler(self._drawing_area, self._present_frame)
+		self._snapshot = self._herdimmunity.snapshots.acquire() # the state being drawn
+		self._world_size = None # the world is as large as the drawing area if it is not set
+		self._pan_position = None
+
+	""" Draw the new part of the epidemic curve (with the mean-field estimate of the simulation) """
+	def _draw_chart(self, widget, context):
+		estimate = self._herdimmunity.mean_field if self._replay_frame is None else None
+		self._chart.draw(context, widget.get_allocated_width(), widget.get_allocated_height(), self._herdimmunity.history, estimate)
 
 	""" Button events """
 	def _draw(self, widget, context):
-		self.print_debug('Drawing area...', 2)
-		context.set_source_rgb(self._border_color[0], self._border_color[1], self._border_color[2])
-		max_width = widget.get_allocated_width()
-		max_height = widget.get_allocated_height()
-		# draw border
-		context.rectangle(0, 0, self._border_width, max_height)
-		context.rectangle(0, max_height - self._border_width, max_width, max_height)
-		context.rectangle(max_width - self._border_width, 0, max_width, max_height)
-		context.rectangle(0, 0, max_width, self._border_width)
-		context.fill()
-		# draw entities
-		for entity in self._herdimmunity.entities:
-			color = self._entity_color[entity.state]
-			context.set_source_rgb(color[0], color[1], color[2])
-			context.arc(self._border_width + self._entity_radius + entity.position[0], self._border_width + self._entity_radius + entity.position[1], self._entity_radius, 0, 2 * math.pi)
-			context.fill()
+		self.trace('Drawing area...', level=VERBOSE)
+		start = time.perf_counter()
+		population = self._replay_frame if self._replay_frame is not None else self._snapshot
+		self._renderer.draw(context, widget.get_allocated_width(), widget.get_allocated_height(), population, self._get_world_size())
+		self._herdimmunity.profiler.add('draw', time.perf_counter() - start)
+
+	""" Viewport events (scroll: zoom, drag: move, double or right click: show the whole world) """
+	def _zoom(self, widget, event):
+		if event.direction == Gdk.ScrollDirection.UP:
+			factor = 1.25
+		elif event.direction == Gdk.ScrollDirection.DOWN:
+			factor = 0.8
+		elif event.direction == Gdk.ScrollDirection.SMOOTH:
+			factor = math.pow(1.25, -event.get_scroll_deltas()[2])
+		else:
+			return False
+		self._renderer.zoom_at(factor, event.x, event.y, widget.get_allocated_width(), widget.get_allocated_height(), self._get_world_size())
+		self.render_area()
+		return True
+
+	def _area_button_press(self, widget, event):
+		if event.button == 3 or event.type == Gdk.EventType._2BUTTON_PRESS:
+			self.trace('Showing the whole world')
+			self._renderer.fit()
+			self.render_area()
+		elif event.button == 1:
+			self._pan_position = (event.x, event.y)
+		return True
+
+	def _pan(self, widget, event):
+		if not event.state & Gdk.ModifierType.BUTTON1_MASK or self._pan_position is None:
+			return False
+		self._renderer.pan(event.x - self._pan_position[0], event.y - self._pan_position[1], widget.get_allocated_width(), widget.get_allocated_height(), self._get_world_size())
+		self._pan_position = (event.x, event.y)
+		self.render_area()
+		return True
+
+	""" Size of the world being drawn (None if it fits the drawing area) """
+	def _get_world_size(self):
+		if self._replay_frame is not None:
+			return self._trajectory.area_size
+		return self._world_size
 
 	def _start(self, widget):
-		self.print_debug('Start button clicked')
+		self.trace('Start button clicked')
 		self._start_button.hide()
 		self._stop_button.show()
 		self._pause_button.set_sensitive(True)
 		self._speedup_button.set_sensitive(True)
-		self.set_resizable(False)
+		self._replay_button.set_sensitive(False)
+		# the size of a world which fits the drawing area must not change while it is simulated
+		self.set_resizable(self._world_size is not None)
 		self._zero_infection_reached = False
+		self._chart.clear()
 		self._herdimmunity.start_simulation()
 
 	def _stop(self, widget):
-		self.print_debug('Stop button clicked')
+		self.trace('Stop button clicked')
 		self._stop_button.hide()
 		self._start_button.show()
 		self._pause_button.set_active(False)
 		self._pause_button.set_sensitive(False)
 		self._speedup_button.set_sensitive(False)
+		self._replay_button.set_sensitive(True)
+		self._record_button.set_active(False)
 		self.set_resizable(True)
 		self._herdimmunity.stop_simulation()
+		scheduler = self._frame_scheduler
+		self.trace('Frames: %d requested, %d drawn, %d coalesced, %d dropped', scheduler.requested, scheduler.drawn, scheduler.coalesced, scheduler.dropped)
 
 	def _pause(self, widget):
 		if widget.get_active():
-			self.print_debug('Pause button pressed')
+			self.trace('Pause button pressed')
 			self._herdimmunity.pause_simulation()
 		else:
-			self.print_debug('Pause button released')
+			self.trace('Pause button released')
 			self._herdimmunity.continue_simulation()
 
 	def _speedup(self, widget):
 		if widget.get_active():
-			self.print_debug('Speedup button pressed')
+			self.trace('Speedup button pressed')
 			self._herdimmunity.change_settings(speed_ratio=self._speedup_ratio)
 		else:
-			self.print_debug('Speedup button released')
+			self.trace('Speedup button released')
 			self._herdimmunity.change_settings(speed_ratio=1)
 
 	def _properties(self, widget):
-		self.print_debug('Properties button clicked')
+		self.trace('Properties button clicked')
 		dialog = SettingsDialog(self)
 		dialog.pause_on_zero_infection.set_active(self._pause_on_zero_infection)
+		dialog.as_fast_as_possible.set_active(self._herdimmunity.as_fast_as_possible)
 		dialog.speedup_ratio.set_value(self._speedup_ratio)
+		dialog.square_threshold.set_value(self._renderer.square_threshold)
+		dialog.heatmap_threshold.set_value(self._renderer.heatmap_threshold)
+		dialog.world_width.set_value(self._world_size[0] if self._world_size is not None else 0)
+		dialog.world_height.set_value(self._world_size[1] if self._world_size is not None else 0)
 		dialog.entity_velocity.set_value(self._herdimmunity.entity_velocity)
 		dialog.entity_number.set_value(self._herdimmunity.entity_number)
 		dialog.initial_virus_carrier_number.set_value(self._herdimmunity.initial_virus_carrier_number)
@@ -350,31 +464,120 @@ class MainWindow(Gtk.Window):
 		dialog.healing_time.set_value(self._herdimmunity.healing_time)
 		dialog.immunity_time.set_value(self._herdimmunity.immunity_time)
 		dialog.infectious_distance.set_value(self._herdimmunity.infectious_distance)
-		self.print_debug('Showing settings dialog...')
+		dialog.trace_level.set_value(self._herdimmunity.tracer.level)
+		self.trace('Showing settings dialog...')
 		response = dialog.run()
 		if response == Gtk.ResponseType.OK:
-			self.print_debug('Applying changes...')
+			self.trace('Applying changes...')
 			self._pause_on_zero_infection = dialog.pause_on_zero_infection.get_active()
 			self._speedup_ratio = dialog.speedup_ratio.get_value()
+			self._renderer.square_threshold = dialog.square_threshold.get_value_as_int()
+			self._renderer.heatmap_threshold = dialog.heatmap_threshold.get_value_as_int()
+			world_size = (dialog.world_width.get_value_as_int(), dialog.world_height.get_value_as_int())
+			# the world size of a running simulation changes with the next start
+			self._world_size = world_size if world_size[0] > 0 and world_size[1] > 0 else None
+			self._renderer.fit()
 			self._herdimmunity.change_settings(
 				speed_ratio=(self._speedup_ratio if self._speedup_button.get_active() else 1),
+				as_fast_as_possible=dialog.as_fast_as_possible.get_active(),
 				entity_velocity=dialog.entity_velocity.get_value(),
 				entity_number=dialog.entity_number.get_value_as_int(),
 				initial_virus_carrier_number=dialog.initial_virus_carrier_number.get_value_as_int(),
 				infection_chance=dialog.infection_chance.get_value_as_int(),
 				healing_time=dialog.healing_time.get_value_as_int(),
 				immunity_time=dialog.immunity_time.get_value_as_int(),
-				infectious_distance=dialog.infectious_distance.get_value_as_int()
+				infectious_distance=dialog.infectious_distance.get_value_as_int(),
+				trace_level=dialog.trace_level.get_value_as_int()
 			)
 		dialog.destroy()
-		self.print_debug('Settings dialog closed')
+		self.trace('Settings dialog closed')
+
+	def _record(self, widget):
+		if widget.get_active():
+			self.trace('Record button pressed')
+			path = self._choose_file('Felvétel mentése', Gtk.FileChooserAction.SAVE)
+			if path is None:
+				widget.set_active(False)
+				return
+			self._herdimmunity.start_recording(path)
+		else:
+			self.trace('Record button released')
+			self._herdimmunity.stop_recording()
+
+	def _replay(self, widget):
+		if widget.get_active():
+			self.trace('Replay button pressed')
+			path = self._choose_file('Felvétel megnyitása', Gtk.FileChooserAction.OPEN)
+			if path is None:
+				widget.set_active(False)
+				return
+			try:
+				self._trajectory = TrajectoryReader(path)
+			except (OSError, ValueError) as e:
+				self.trace('Can not open recording: %s', e)
+				widget.set_active(False)
+				return
+			if len(self._trajectory) == 0:
+				self._trajectory = None
+				widget.set_active(False)
+				return
+			self._start_button.set_sensitive(False)
+			self._record_button.set_sensitive(False)
+			self._replay_scale.set_range(0, max(len(self._trajectory) - 1, 1))
+			self._replay_scale.set_value(0)
+			self._replay_scale.show()
+			self._replay_seek(self._replay_scale)
+		else:
+			self.trace('Replay button released')
+			self._trajectory = None
+			self._replay_frame = None
+			self._replay_scale.hide()
+			self._start_button.set_sensitive(True)
+			self._record_button.set_sensitive(True)
+			self.display_info(0)
+			self.render_area()
+
+	def _replay_seek(self, widget):
+		if self._trajectory is None:
+			return
+		index = min((int)(widget.get_value()), len(self._trajectory) - 1)
+		self._replay_frame = self._trajectory.frame(index)
+		self.display_info(self._replay_frame.time, self._replay_frame.counts())
+		self.render_area()
+
+	def _choose_file(self, title, action):
+		dialog = Gtk.FileChooserDialog(title=title, parent=self, action=action)
+		dialog.add_button('Mégsem', Gtk.ResponseType.CANCEL)
+		dialog.add_button('Mentés' if action == Gtk.FileChooserAction.SAVE else 'Megnyitás', Gtk.ResponseType.OK)
+		dialog.set_do_overwrite_confirmation(True)
+		response = dialog.run()
+		path = dialog.get_filename() if response == Gtk.ResponseType.OK else None
+		dialog.destroy()
+		return path
+
+	def _toggle_profiler(self, widget):
+		if widget.get_active():
+			self.trace('Profiler button pressed')
+			self._profiler_box.show()
+			self._update_profiler()
+		else:
+			self.trace('Profiler button released')
+			self._profiler_box.hide()
+
+	def _export_profile(self, widget):
+		self.trace('Export button clicked')
+		path = self._choose_file('Mérések exportálása (.csv vagy .json)', Gtk.FileChooserAction.SAVE)
+		if path is not None:
+			self._herdimmunity.profiler.export(path)
 
 	def _infect_random(self, widget):
-		self.print_debug('Infect random button clicked')
+		self.trace('Infect random button clicked')
 		self._herdimmunity.infect_random()
 
 	""" Get the 'livable' size of the area """
 	def get_area_size(self):
+		if self._world_size is not None:
+			return self._world_size
 		width = self._drawing_area.get_allocated_width() - 2 * self._border_width - 2 * self._entity_radius
 		height = self._drawing_area.get_allocated_height() - 2 * self._border_width - 2 * self._entity_radius
 		return (width, height)
@@ -383,12 +586,35 @@ class MainWindow(Gtk.Window):
 	def render_area(self):
 		self._drawing_area.queue_draw()
 
+	""" Ask for a new frame (can be called from any thread, redraws are coalesced) """
+	def request_frame(self, time):
+		self._frame_scheduler.request(time)
+
+	def _present_frame(self, simulation_time):
+		self.render_area()
+		start = time.perf_counter()
+		# the simulation thread never writes the acquired snapshot, so it can be drawn and displayed without locking
+		self._snapshot = self._herdimmunity.snapshots.acquire()
+		self.display_info(self._snapshot.time, self._snapshot.counts())
+		self._chart_area.queue_draw()
+		self._herdimmunity.profiler.add('info', time.perf_counter() - start)
+		if self._profiler_button.get_active() and start - self._profiler_update_time >= 0.5:
+			self._update_profiler()
+
+	""" Show the statistics of the profiler in the overlay """
+	def _update_profiler(self):
+		self._profiler_update_time = time.perf_counter()
+		text = GLib.markup_escape_text(self._herdimmunity.profiler.format())
+		self._profiler_label.set_markup(f"<span face='Monospace' background='#ffffffc0'>{text}</span>")
+
 	""" Display simulation info """
-	def display_info(self, time):
+	def display_info(self, time, counts = None):
 		if time == 0:
 			self._time_label.set_markup("<span face='Monospace'>-</span>")
 			self._infection_label.set_markup("<span face='Monospace'>-</span>")
 			self._immunity_label.set_markup("<span face='Monospace'>-</span>")
+			self._estimate_label.set_markup("<span face='Monospace'>-</span>")
+			self._frame_time_label.set_markup("<span face='Monospace'>-</span>")
 		else:
 			# display time
 			minutes = (int)(time / 1000 / 60)
@@ -396,32 +622,93 @@ class MainWindow(Gtk.Window):
 			hundredths = (int)(time / 10 % 100)
 			self._time_label.set_markup(f"<span face='Monospace'>{'0' + str(minutes) if minutes < 10 else minutes}:{'0' + str(seconds) if seconds < 10 else seconds}.{'0' + str(hundredths) if hundredths < 10 else hundredths}</span>")
 			# display infection and immunity percentage
-			infection_sum = 0
-			immunity_sum = 0
-			count = 0
-			for entity in self._herdimmunity.entities:
-				if entity.state == HerdImmunity.Entity.STATE_INFECTED:
-					infection_sum += 1
-				elif entity.state == HerdImmunity.Entity.STATE_IMMUNE:
-					immunity_sum += 1
-				count += 1
+			healthy_sum, infection_sum, immunity_sum = counts if counts is not None else self._snapshot.counts()
+			count = healthy_sum + infection_sum + immunity_sum
+			if count == 0:
+				return
 			self._infection_label.set_markup(f"<span face='Monospace'>{(int)(infection_sum / count * 100)}%</span>")
 			self._immunity_label.set_markup(f"<span face='Monospace'>{(int)(immunity_sum / count * 100)}%</span>")
+			# expected infection and immunity percentage (a recorded run may have other settings)
+			if self._replay_frame is None and self._herdimmunity.mean_field is not None:
+				healthy, infected, immune = self._herdimmunity.mean_field.at(time, extend=False)
+				self._estimate_label.set_markup(f"<span face='Monospace'>{(int)(infected / count * 100)}% / {(int)(immune / count * 100)}%</span>")
+			else:
+				self._estimate_label.set_markup("<span face='Monospace'>-</span>")
+			self._frame_time_label.set_markup(f"<span face='Monospace'>{self._renderer.frame_time:.1f} ms</span>")
 			# pause simulation if infection percentage reach 0
-			if not self._zero_infection_reached and self._pause_on_zero_infection and infection_sum == 0:
-				self.print_debug('Zero infection reached, pause')
+			if self._replay_frame is None and not self._zero_infection_reached and self._pause_on_zero_infection and infection_sum == 0:
+				self.trace('Zero infection reached, pause')
 				self._pause_button.set_active(True)
 				self._zero_infection_reached = True
 
-	""" Print debug message """
-	def print_debug(self, text, level = 1):
-		if self._debugging >= level:
-			self._herdimmunity.print_debug('MainWindow: ' + text)
+	""" Trace debug message """
+	def trace(self, message, *args, level = INFO):
+		self._herdimmunity.trace(message, *args, level=level, source='MainWindow')
 
 
 # ======  End of MainWindow Class  =======
 
 
+# ============================================
+# =           FrameScheduler Class           =
+# ============================================
+
+class FrameScheduler:
+
+	""" Constructor """
+	def __init__(self, widget, callback):
+		self._widget = widget
+		self._callback = callback # called on the GTK thread with the latest requested data
+		self._lock = threading.Lock()
+		self._data = None
+		self._dirty = False
+		self._scheduled = False
+		self._frame_counter = None
+		# statistics
+		self.requested = 0 # frame requests of the simulation
+		self.drawn = 0 # frames presented
+		self.coalesced = 0 # requests merged into a later frame
+		self.dropped = 0 # frame clock frames missed while frames were pending
+
+	""" Request a frame (can be called from any thread) """
+	def request(self, data):
+		with self._lock:
+			self.requested += 1
+			if self._dirty:
+				self.coalesced += 1
+			self._data = data
+			self._dirty = True
+			if self._scheduled:
+				return
+			self._scheduled = True
+		Gdk.threads_add_idle(GLib.PRIORITY_DEFAULT_IDLE, self._install)
+
+	def _install(self):
+		self._widget.add_tick_callback(self._tick)
+		return False
+
+	""" Frame clock callback (at most one frame is in flight, the rest is coalesced) """
+	def _tick(self, widget, frame_clock):
+		frame_counter = frame_clock.get_frame_counter()
+		if self._frame_counter is not None and frame_counter - self._frame_counter > 1:
+			self.dropped += frame_counter - self._frame_counter - 1
+		self._frame_counter = frame_counter
+		with self._lock:
+			if not self._dirty:
+				# nothing to draw, sleep until the next request
+				self._scheduled = False
+				self._frame_counter = None
+				return False
+			self._dirty = False
+			data = self._data
+		self.drawn += 1
+		self._callback(data)
+		return True
+
+
+# ======  End of FrameScheduler Class  =======
+
+
 # ============================================
 # =           SettingsDialog Class           =
 # ============================================
@@ -445,6 +732,12 @@ class SettingsDialog(Gtk.Dialog):
 		box.pack_end(self.pause_on_zero_infection, False, False, 0)
 		settings_box.pack_start(box, False, False, 0)
 
+		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
+		box.pack_start(Gtk.Label(label='Futtatás maximális sebességgel'), False, False, 0)
+		self.as_fast_as_possible = Gtk.Switch(margin_left=10)
+		box.pack_end(self.as_fast_as_possible, False, False, 0)
+		settings_box.pack_start(box, False, False, 0)
+
 		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
 		box.pack_start(Gtk.Label(label='Gyorsítási szorzó:'), False, False, 0)
 		self.speedup_ratio = Gtk.SpinButton(margin_left=10)
@@ -454,6 +747,39 @@ class SettingsDialog(Gtk.Dialog):
 		box.pack_end(self.speedup_ratio, False, False, 0)
 		settings_box.pack_start(box, False, False, 0)
 
+		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
+		box.pack_start(Gtk.Label(label='Négyzetes rajzolás ágensszám felett:'), False, False, 0)
+		self.square_threshold = Gtk.SpinButton(margin_left=10)
+		self.square_threshold.set_range(0, 1000000)
+		self.square_threshold.set_increments(100, 1000)
+		self.square_threshold.set_digits(0)
+		box.pack_end(self.square_threshold, False, False, 0)
+		settings_box.pack_start(box, False, False, 0)
+
+		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
+		box.pack_start(Gtk.Label(label='Sűrűségtérkép látható ágensszám felett:'), False, False, 0)
+		self.heatmap_threshold = Gtk.SpinButton(margin_left=10)
+		self.heatmap_threshold.set_range(0, 10000000)
+		self.heatmap_threshold.set_increments(1000, 10000)
+		self.heatmap_threshold.set_digits(0)
+		box.pack_end(self.heatmap_threshold, False, False, 0)
+		settings_box.pack_start(box, False, False, 0)
+
+		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
+		box.pack_start(Gtk.Label(label='Világ mérete (pixel, 0: az ablakhoz igazodik):'), False, False, 0)
+		self.world_height = Gtk.SpinButton(margin_left=5)
+		self.world_height.set_range(0, 100000)
+		self.world_height.set_increments(10, 100)
+		self.world_height.set_digits(0)
+		box.pack_end(self.world_height, False, False, 0)
+		box.pack_end(Gtk.Label(label='x', margin_left=5), False, False, 0)
+		self.world_width = Gtk.SpinButton(margin_left=10)
+		self.world_width.set_range(0, 100000)
+		self.world_width.set_increments(10, 100)
+		self.world_width.set_digits(0)
+		box.pack_end(self.world_width, False, False, 0)
+		settings_box.pack_start(box, False, False, 0)
+
 		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
 		box.pack_start(Gtk.Label(label='Ágensek sebessége (pixel/mp):'), False, False, 0)
 		self.entity_velocity = Gtk.SpinButton(margin_left=10)
@@ -466,7 +792,7 @@ class SettingsDialog(Gtk.Dialog):
 		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
 		box.pack_start(Gtk.Label(label='Ágensek száma:'), False, False, 0)
 		self.entity_number = Gtk.SpinButton(margin_left=10)
-		self.entity_number.set_range(1, 1000)
+		self.entity_number.set_range(1, 1000000)
 		self.entity_number.set_increments(1, 1)
 		self.entity_number.set_digits(0)
 		box.pack_end(self.entity_number, False, False, 0)
@@ -475,7 +801,7 @@ class SettingsDialog(Gtk.Dialog):
 		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
 		box.pack_start(Gtk.Label(label='Kezdeti ferzőzöttek száma:'), False, False, 0)
 		self.initial_virus_carrier_number = Gtk.SpinButton(margin_left=10)
-		self.initial_virus_carrier_number.set_range(0, 1000)
+		self.initial_virus_carrier_number.set_range(0, 1000000)
 		self.initial_virus_carrier_number.set_increments(1, 1)
 		self.initial_virus_carrier_number.set_digits(0)
 		box.pack_end(self.initial_virus_carrier_number, False, False, 0)
@@ -517,6 +843,15 @@ class SettingsDialog(Gtk.Dialog):
 		box.pack_end(self.infectious_distance, False, False, 0)
 		settings_box.pack_start(box, False, False, 0)
 
+		box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, margin_bottom=10)
+		box.pack_start(Gtk.Label(label='Naplózás részletessége (0-2):'), False, False, 0)
+		self.trace_level = Gtk.SpinButton(margin_left=10)
+		self.trace_level.set_range(0, 2)
+		self.trace_level.set_increments(1, 1)
+		self.trace_level.set_digits(0)
+		box.pack_end(self.trace_level, False, False, 0)
+		settings_box.pack_start(box, False, False, 0)
+
 		area.add(settings_box)
 
 		self.show_all()
@@ -535,131 +870,142 @@ class MainThread(threading.Thread):
 	def __init__(self, herdimmunity, **kwargs):
 		super(MainThread, self).__init__()
 		self._herdimmunity = herdimmunity
-		self._debugging = kwargs['debugging'] if 'debugging' in kwargs else 0
 		self._tick = kwargs['tick'] if 'tick' in kwargs else 100 # in milliseconds
-
-	""" Inherited function - call start() instead """
-	def run(self):
-		self.print_debug('Thread is running...')
-		self._time = 0 # in milliseconds
+		self._step_budget = kwargs['step_budget'] if 'step_budget' in kwargs else 0.8 # part of a tick which can be spent on stepping
+		self._step_cost = None # measured wall time of a step (in seconds)
+		# commands (function, arguments) sent by the other threads, applied in order between the ticks
+		self._commands = collections.deque()
+		self._condition = threading.Condition()
+		# state of the loop, only used by this thread
 		self._is_running = True
-		self._s_paused = False
-		self._s_started = False
-		self._s_infect_random = False
-		self._actual_entity_connections = set()
+		self._simulating = False
+		self._paused = False
+		self._deadline = 0 # monotonic time of the next tick (in seconds)
+
+	"""
+	   Inherited function - call start() instead
+	   The thread sleeps until the next tick while the simulation runs and until the next command
+	   otherwise. The ticks follow a monotonic clock: the next one is due a tick after the previous
+	   deadline, not a tick after the (variable length) work.
+	"""
+	def run(self):
+		self.trace('Thread is running...')
+		profiler = self._herdimmunity.profiler
 		while self._is_running:
-			if self._s_started:
-				if not self._s_paused:
-					# infect new entities
-					new_infected_entities = []
-					for i in range(len(self._herdimmunity.entities)):
-						for j in range(i, len(self._herdimmunity.entities)):
-							entity1 = self._herdimmunity.entities[i]
-							entity2 = self._herdimmunity.entities[j]
-							dx = abs(entity1.position[0] - entity2.position[0])
-							if dx > self._herdimmunity.infectious_distance:
-								self._actual_entity_connections.discard((entity1.id, entity2.id))
-								continue
-							dy = abs(entity1.position[1] - entity2.position[1])
-							if dy > self._herdimmunity.infectious_distance:
-								self._actual_entity_connections.discard((entity1.id, entity2.id))
-								continue
-							if math.pow(dx, 2) + math.pow(dy, 2) > math.pow(self._herdimmunity.infectious_distance, 2):
-								self._actual_entity_connections.discard((entity1.id, entity2.id))
-								continue
-							if (entity1.id, entity2.id) in self._actual_entity_connections:
-								continue
-							self._actual_entity_connections.add((entity1.id, entity2.id))
-							if entity1.state == HerdImmunity.Entity.STATE_INFECTED and entity2.state == HerdImmunity.Entity.STATE_HEALTHY:
-								new_infected_entities.append(entity2)
-							elif entity2.state == HerdImmunity.Entity.STATE_INFECTED and entity1.state == HerdImmunity.Entity.STATE_HEALTHY:
-								new_infected_entities.append(entity1)
-					for entity in new_infected_entities:
-						if randint(0, 100) < self._herdimmunity.infection_chance:
-							entity.state = HerdImmunity.Entity.STATE_INFECTED
-							entity.state_time = self._time
-					# change entity states if necessary
-					for entity in self._herdimmunity.entities:
-						if entity.state == HerdImmunity.Entity.STATE_INFECTED:
-							if entity.state_time + self._herdimmunity.healing_time * 1000 <= self._time:
-								entity.state = HerdImmunity.Entity.STATE_IMMUNE
-								entity.state_time = self._time
-						elif entity.state == HerdImmunity.Entity.STATE_IMMUNE:
-							if entity.state_time + self._herdimmunity.immunity_time * 1000 <= self._time:
-								entity.state = HerdImmunity.Entity.STATE_HEALTHY
-								entity.state_time = self._time
-					# move entities
-					for entity in self._herdimmunity.entities:
-						s = self._herdimmunity.entity_velocity * self._tick / 1000.0 * self._herdimmunity.speed_ratio
-						dx = math.cos(entity.direction) * s
-						dy = math.sin(entity.direction) * s
-						nx = entity.position[0] + dx
-						ny = entity.position[1] + dy
-						if nx < 0:
-							nx = entity.position[0] - dx
-							entity.direction = math.pi - entity.direction
-						elif nx > self._herdimmunity.area_size[0]:
-							nx = entity.position[0] - dx
-							entity.direction = math.pi - entity.direction
-						if ny < 0:
-							ny = entity.position[1] - dy
-							entity.direction = 2 * math.pi - entity.direction
-						elif ny > self._herdimmunity.area_size[1]:
-							ny = entity.position[1] - dy
-							entity.direction = 2 * math.pi - entity.direction
-						self.print_debug(f"id: {entity.id}, x: {entity.position[0]}, y: {entity.position[1]} -> dx: {dx}, dy: {dy} -> nx: {nx}, ny: {ny}", 2)
-						entity.position = (nx, ny)
-					# increase time
-					self._time += self._tick * self._herdimmunity.speed_ratio
-				# infect random entity
-				if self._s_infect_random:
-					self._s_infect_random = False
-					index = randint(1, len(self._herdimmunity.entities)) - 1
-					i = index
-					while self._herdimmunity.entities[i].state != HerdImmunity.Entity.STATE_HEALTHY:
-						i += 1
-						if i >= len(self._herdimmunity.entities):
-							i = 0
-						if i == index:
-							break
-					if self._herdimmunity.entities[i].state == HerdImmunity.Entity.STATE_HEALTHY:
-						self._herdimmunity.entities[i].state = HerdImmunity.Entity.STATE_INFECTED
-						self._herdimmunity.entities[i].state_time = self._time
-				self._herdimmunity.refresh_simulation_area(self._time)
-			else:
-				if self._time > 0:
-					self.print_debug('Stopping simulation...')
-					self._time = 0
-					self._actual_entity_connections.clear()
-					self._herdimmunity.entities = []
-					self._herdimmunity.refresh_simulation_area(0)
-			time.sleep(self._tick / 1000.0)
-		self.print_debug('Thread stopped')
-
-	""" Controller functions """
-	def s_start(self):
-		self._s_started = True
+			with self._condition:
+				while not self._commands:
+					if not self._simulating or self._paused:
+						self._condition.wait()
+						continue
+					timeout = self._deadline - time.monotonic()
+					if timeout <= 0:
+						break
+					self._condition.wait(timeout)
+				commands = list(self._commands)
+				self._commands.clear()
+			for function, args in commands:
+				function(*args)
+			if self._simulating and not self._paused and time.monotonic() >= self._deadline:
+				tick_start = time.perf_counter()
+				self._advance()
+				profiler.add('simulate', time.perf_counter() - tick_start)
+				profiler.count('ticks')
+				if self._herdimmunity.metrics is not None:
+					self._herdimmunity.metrics.tick()
+				self._herdimmunity.history.add(self._herdimmunity.time, *self._herdimmunity.count_states())
+				if self._herdimmunity.mean_field is not None:
+					# the chart shows up to twice the simulated time
+					self._herdimmunity.mean_field.prepare(2 * self._herdimmunity.time)
+				self._herdimmunity.refresh_simulation_area(self._herdimmunity.time)
+				now = time.monotonic()
+				if self._herdimmunity.as_fast_as_possible:
+					self._deadline = now
+				else:
+					self._deadline += self._tick / 1000.0
+					# after a stall the ticks go on from now instead of catching up in a burst
+					if self._deadline < now - self._tick / 1000.0:
+						self._deadline = now
+			elif commands and self._simulating:
+				# show the effect of the commands while paused
+				self._herdimmunity.refresh_simulation_area(self._herdimmunity.time)
+		self.trace('Thread stopped')
+
+	""" Advance the simulation in fixed timesteps, as many as fit into the step budget of a tick """
+	def _advance(self):
+		as_fast_as_possible = self._herdimmunity.as_fast_as_possible
+		# without sleeping the steps can fill the whole tick
+		budget = self._tick / 1000.0 * (1 if as_fast_as_possible else self._step_budget)
+		max_steps = max(1, (int)(budget / self._step_cost)) if self._step_cost else 1
+		start = time.perf_counter()
+		if as_fast_as_possible:
+			steps = self._herdimmunity.advance(max_steps * self._herdimmunity.timestep, max_steps)
+		else:
+			# substeps which do not fit into the budget are dropped (the simulation slows down instead of taking longer steps)
+			steps = self._herdimmunity.advance(self._tick * self._herdimmunity.speed_ratio, max_steps)
+		if steps > 0:
+			cost = (time.perf_counter() - start) / steps
+			self._step_cost = cost if self._step_cost is None else self._step_cost + (cost - self._step_cost) * 0.2
+
+	""" Controller functions (called by the other threads) """
+	def s_start(self, area_size):
+		self._send(self._on_start, area_size)
 
 	def s_pause(self):
-		self._s_paused = True
+		self._send(self._on_pause)
 
 	def s_continue(self):
-		self._s_paused = False
+		self._send(self._on_continue)
 
 	def s_stop(self):
-		self._s_started = False
+		self._send(self._on_stop)
 
 	def s_infect_random(self):
-		self._s_infect_random = True
+		self._send(self._on_infect_random)
+
+	""" Run a function on this thread, in order with the other commands """
+	def s_run(self, function, *args):
+		self._send(function, *args)
 
-	""" Terminate thread """
+	""" Terminate thread (after the commands sent before) """
 	def stop(self):
+		self._send(self._on_quit)
+
+	def _send(self, function, *args):
+		with self._condition:
+			self._commands.append((function, args))
+			self._condition.notify()
+
+	""" Command handlers """
+	def _on_start(self, area_size):
+		self._herdimmunity.prepare_simulation(area_size)
+		self._simulating = True
+		self._paused = False
+		self._deadline = time.monotonic()
+
+	def _on_pause(self):
+		self._paused = True
+
+	def _on_continue(self):
+		self._paused = False
+		self._deadline = time.monotonic()
+
+	def _on_stop(self):
+		self._simulating = False
+		if self._herdimmunity.time > 0:
+			self.trace('Stopping simulation...')
+		self._herdimmunity.reset()
+		self._herdimmunity.refresh_simulation_area(0)
+
+	def _on_infect_random(self):
+		if self._simulating:
+			self._herdimmunity.infect_random_entity()
+
+	def _on_quit(self):
 		self._is_running = False
 
-	""" Print debug message """
-	def print_debug(self, text, level = 1):
-		if self._debugging >= level:
-			self._herdimmunity.print_debug('MainThread: ' + text)
+	""" Trace debug message """
+	def trace(self, message, *args, level = INFO):
+		self._herdimmunity.trace(message, *args, level=level, source='MainThread')
 
 
 # ======  End of MainThread Class  =======
@@ -667,5 +1013,11 @@ class MainThread(threading.Thread):
 
 # -----------  Start the application  -----------
 
-herdimmunity = HerdImmunity(version='1.0.0', debugging=True)
-herdimmunity.run_app()
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Herd immunity simulation.')
+	parser.add_argument('--trace-level', type=int, default=0, help='detail of the debug messages (0: none, 1: info, 2: verbose, default: 0)')
+	parser.add_argument('--trace', metavar='FILE', help='write the debug messages into this file instead of the standard output')
+	parser.add_argument('--metrics-port', type=int, help='serve the metrics of the simulation in the Prometheus format on http://127.0.0.1:PORT/metrics')
+	args = parser.parse_args()
+	herdimmunity = HerdImmunity(version='1.0.0', tracer=Tracer(level=args.trace_level, path=args.trace), metrics_port=args.metrics_port)
+	herdimmunity.run_app()
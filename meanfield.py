@@ -0,0 +1,185 @@
+#!/usr/bin/python3.7
+import argparse, math, sys
+import numpy as np
+from engine import Engine
+import headless
+
+"""
+   Mean-field SIRS model of the agent simulation.
+
+   An entity meets new entities at the rate rho * 2d * (4v / pi): it sweeps a band of width 2d
+   (d: infectious distance) with the mean relative speed of two entities moving in random directions
+   (4v / pi), through entities of density rho = entity number / area. Every new contact of a healthy
+   and an infected entity infects with the infection chance, so with N entities on an area A
+
+       beta = chance * 2d * (4v / pi) * N / A        (infections per second per S * I / N)
+
+   The infected and the immune state last a fixed time in the simulation; they are modelled by chains
+   of stages (the linear chain trick), which turn exponential durations into Erlang ones. The epidemic
+   dies out when less than half an entity is infected, as it does in the finite population.
+
+   Short healing or immunity times make the stage chain stiff, so it is not stepped explicitly: the
+   linear part is solved exactly with its matrix exponential and only the infections are stepped with
+   Runge-Kutta (an integrating factor method), whose step depends on the transmission rate alone.
+"""
+
+# =======================================
+# =           MeanField Class           =
+# =======================================
+
+class MeanField:
+
+	""" Constructor (takes the settings of the engine, see from_engine()) """
+	def __init__(self, **kwargs):
+		self.entity_number = kwargs['entity_number'] if 'entity_number' in kwargs else 100
+		self.initial_virus_carrier_number = kwargs['initial_virus_carrier_number'] if 'initial_virus_carrier_number' in kwargs else 2
+		self.infection_chance = kwargs['infection_chance'] if 'infection_chance' in kwargs else 12
+		self.infectious_distance = kwargs['infectious_distance'] if 'infectious_distance' in kwargs else 10
+		self.entity_velocity = kwargs['entity_velocity'] if 'entity_velocity' in kwargs else 20
+		self.healing_time = kwargs['healing_time'] if 'healing_time' in kwargs else 12
+		self.immunity_time = kwargs['immunity_time'] if 'immunity_time' in kwargs else 30
+		self.area_size = kwargs['area_size'] if 'area_size' in kwargs else (330, 230)
+		self.stages = kwargs['stages'] if 'stages' in kwargs else 8 # stages of the infected and the immune state
+		# shortest modelled duration (a state lasts at least one step in the simulation, in seconds)
+		self._minimum_time = (kwargs['timestep'] if 'timestep' in kwargs else 30) / 1000.0
+		self.resolution = kwargs['resolution'] if 'resolution' in kwargs else 250 # sample interval of the curve used by at() (ms)
+		self._curve = None
+
+	""" Mean-field model of an engine's current settings """
+	@classmethod
+	def from_engine(cls, engine, area_size = None):
+		settings = {key: getattr(engine, key) for key in ('entity_number', 'initial_virus_carrier_number', 'infection_chance', 'infectious_distance', 'entity_velocity', 'healing_time', 'immunity_time', 'timestep')}
+		return cls(area_size=area_size if area_size is not None else engine.area_size, **settings)
+
+	""" Infections per second per S * I / N """
+	def transmission_rate(self):
+		area = max(self.area_size[0] * self.area_size[1], 1)
+		# randint(0, 100) < chance
+		chance = min(max(self.infection_chance, 0), 101) / 101.0
+		return chance * 2 * self.infectious_distance * (4 * self.entity_velocity / math.pi) * self.entity_number / area
+
+	""" Basic reproduction number (infections caused by one infected entity in a healthy population) """
+	def reproduction_number(self):
+		return self.transmission_rate() * max(self.healing_time, self._minimum_time)
+
+	""" Healthy, infected and immune entities at every sample (times in milliseconds, counts are expected values) """
+	def curve(self, duration, sample_interval = 1000):
+		k = self.stages
+		n = max(self.entity_number, 1)
+		beta = self.transmission_rate()
+		healing_rate = k / max(self.healing_time, self._minimum_time)
+		immunity_rate = k / max(self.immunity_time, self._minimum_time)
+		# state: healthy, infected stages, immune stages; the stage changes are linear
+		size = 1 + 2 * k
+		linear = np.zeros((size, size))
+		for s in range(1, k + 1):
+			linear[s, s] -= healing_rate
+			linear[s + 1, s] += healing_rate
+		for s in range(k + 1, 2 * k + 1):
+			linear[s, s] -= immunity_rate
+			linear[(s + 1) % size, s] += immunity_rate
+		infected = np.zeros(size)
+		infected[1:k + 1] = 1
+		def infections(u):
+			change = np.zeros(size)
+			change[1] = beta * u[0] * (infected @ u) / n
+			change[0] = -change[1]
+			return change
+		u = np.zeros(size)
+		carriers = min(self.initial_virus_carrier_number, self.entity_number)
+		u[0] = self.entity_number - carriers
+		u[1] = carriers
+		# equal steps between the samples, small enough for the infections only
+		dt = min(0.25, 0.5 / beta) if beta > 0 else 0.25
+		substeps = max(1, (int)(math.ceil(sample_interval / 1000.0 / dt)))
+		h = sample_interval / 1000.0 / substeps
+		# the stage changes over a step and over half of it
+		step = _expm(linear * h)
+		half_step = _expm(linear * h / 2)
+		samples = (int)(duration // sample_interval) + 1
+		times = np.arange(samples) * sample_interval
+		result = np.zeros((samples, 3))
+		for i in range(samples):
+			if i > 0:
+				for s in range(substeps):
+					# fourth order Runge-Kutta of the infections, the stage changes are exact
+					k1 = infections(u)
+					k2 = infections(half_step @ (u + h / 2 * k1))
+					k3 = infections(half_step @ u + h / 2 * k2)
+					k4 = infections(step @ u + h * (half_step @ k3))
+					u = np.maximum(step @ u + h / 6 * (step @ k1 + 2 * (half_step @ (k2 + k3)) + k4), 0)
+					# less than half an infected entity means the epidemic died out in a finite population
+					if 0 < u[1:k + 1].sum() < 0.5:
+						u[k + 1] += u[1:k + 1].sum()
+						u[1:k + 1] = 0
+			result[i] = (u[0], u[1:k + 1].sum(), u[k + 1:].sum())
+		return times, result[:, 0], result[:, 1], result[:, 2]
+
+	""" Compute the curve used by at() until time at least (in milliseconds; it is extended to twice its length when it is too short) """
+	def prepare(self, time):
+		curve = self._curve
+		if curve is None or time > curve[0][-1]:
+			duration = max(time, 2 * curve[0][-1] if curve is not None else 600000)
+			self._curve = self.curve(duration + self.resolution, self.resolution)
+
+	"""
+	   Expected healthy, infected and immune entities at a time (in milliseconds)
+	   The curve is computed when needed, unless extend is False: then only the prepared curve is
+	   interpolated (its last counts are given after its end), which is cheap enough for any thread.
+	"""
+	def at(self, time, extend = True):
+		if extend:
+			self.prepare(time)
+		curve = self._curve
+		return tuple((float)(np.interp(time, curve[0], counts)) for counts in curve[1:])
+
+
+# ======  End of MeanField Class  =======
+
+
+""" Matrix exponential (scaling and squaring of the Taylor series, for the small matrices of the model) """
+def _expm(matrix):
+	norm = np.abs(matrix).sum(axis=1).max()
+	squarings = max(0, (int)(math.ceil(math.log2(norm))) + 1) if norm > 0 else 0
+	matrix = matrix / 2 ** squarings
+	result = np.eye(len(matrix))
+	term = np.eye(len(matrix))
+	for k in range(1, 18):
+		term = term @ matrix / k
+		result = result + term
+	for i in range(squarings):
+		result = result @ result
+	return result
+
+
+def create_parser():
+	parser = argparse.ArgumentParser(description='Estimate the S/I/R curves of a configuration with the mean-field SIRS model.')
+	headless.add_settings_arguments(parser)
+	parser.add_argument('--sample-interval', type=float, default=1, help='time between the rows of the output (sec, default: 1)')
+	parser.add_argument('--stages', type=int, default=8, help='stages of the infected and the immune state (default: 8)')
+	parser.add_argument('--output', '-o', help='write the curves into this CSV file instead of the standard output')
+	return parser
+
+def main(argv = None):
+	args = create_parser().parse_args(argv)
+	engine = Engine(area_size=args.area_size)
+	engine.change_settings(**headless.settings_from_args(args))
+	model = MeanField.from_engine(engine)
+	model.stages = args.stages
+	times, healthy, infected, immune = model.curve(args.duration * 1000, args.sample_interval * 1000)
+	output = open(args.output, 'w') if args.output else sys.stdout
+	try:
+		output.write(f"# beta={model.transmission_rate():.4f}/s R0={model.reproduction_number():.2f}\n")
+		output.write('time,healthy,infected,immune\n')
+		for i in range(len(times)):
+			output.write(f"{times[i] / 1000:.3f},{healthy[i]:.2f},{infected[i]:.2f},{immune[i]:.2f}\n")
+	finally:
+		if output is not sys.stdout:
+			output.close()
+	return 0
+
+
+# -----------  Start the estimate  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
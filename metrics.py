@@ -0,0 +1,139 @@
+import os, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+import numpy as np
+from profiler import Window
+
+"""
+   Metrics of a running simulation in the Prometheus text format.
+   The simulation thread only updates a few counters after every step; a scrape formats them in the
+   thread of the server, without touching the entities or waiting for the simulation.
+"""
+
+# =====================================
+# =           Metrics Class           =
+# =====================================
+
+class Metrics:
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		size = kwargs['window'] if 'window' in kwargs else 1024 # number of recent steps the rates and the percentiles are computed from
+		self._durations = Window(size) # wall time of the steps (in seconds)
+		self._step_times = Window(size) # when the steps finished (perf_counter)
+		self._tick_times = Window(size)
+		self.steps = 0
+		self.step_seconds = 0.0 # wall time of every step
+		self.ticks = 0
+		# time, counts and memory of the simulation after the last step (replaced at once, never changed)
+		self._state = (0, (0, 0, 0), 0)
+
+	""" Count a step of the engine which took seconds (called by the simulation thread) """
+	def update(self, engine, seconds):
+		self._durations.add(seconds)
+		self._step_times.add(perf_counter())
+		self.steps += 1
+		self.step_seconds += seconds
+		self._state = (engine.time, engine.count_states(), engine.entities.nbytes() + engine.contacts.nbytes())
+
+	""" Count a tick of the window's simulation loop """
+	def tick(self):
+		self._tick_times.add(perf_counter())
+		self.ticks += 1
+
+	""" Current metrics in the Prometheus text format """
+	def format(self):
+		time, counts, state_bytes = self._state
+		durations = self._durations.values()
+		lines = []
+		def metric(name, kind, description, samples):
+			lines.append(f"# HELP {name} {description}")
+			lines.append(f"# TYPE {name} {kind}")
+			for labels, value in samples:
+				lines.append(f"{name}{labels} {value}")
+		metric('herdimmunity_entities', 'gauge', 'Number of entities by state.', [
+			(f'{{state="{state}"}}', count) for state, count in zip(('healthy', 'infected', 'immune'), counts)
+		])
+		metric('herdimmunity_simulated_seconds', 'gauge', 'Simulated time.', [('', time / 1000)])
+		metric('herdimmunity_steps_total', 'counter', 'Steps of the simulation.', [('', self.steps)])
+		metric('herdimmunity_steps_per_second', 'gauge', 'Steps per wall clock second over the recent steps.', [('', _rate(self._step_times))])
+		metric('herdimmunity_ticks_total', 'counter', 'Ticks of the simulation loop of the window.', [('', self.ticks)])
+		metric('herdimmunity_ticks_per_second', 'gauge', 'Ticks per wall clock second over the recent ticks.', [('', _rate(self._tick_times))])
+		quantiles = np.percentile(durations, (50, 90, 99)) if len(durations) > 0 else (float('nan'),) * 3
+		metric('herdimmunity_step_seconds', 'summary', 'Wall time of a step (quantiles of the recent steps).', [
+			(f'{{quantile="{quantile}"}}', (float)(value)) for quantile, value in zip(('0.5', '0.9', '0.99'), quantiles)
+		])
+		lines.append(f"herdimmunity_step_seconds_sum {self.step_seconds}")
+		lines.append(f"herdimmunity_step_seconds_count {self.steps}")
+		metric('herdimmunity_state_bytes', 'gauge', 'Memory of the entity and contact arrays.', [('', state_bytes)])
+		resident = _resident_memory()
+		if resident is not None:
+			metric('process_resident_memory_bytes', 'gauge', 'Resident memory of the process.', [('', resident)])
+		return '\n'.join(lines) + '\n'
+
+
+# ======  End of Metrics Class  =======
+
+
+""" Events per second over the timestamps in a window """
+def _rate(timestamps):
+	values = timestamps.values()
+	if len(values) < 2:
+		return 0.0
+	elapsed = values.max() - values.min()
+	return (float)((len(values) - 1) / elapsed) if elapsed > 0 else 0.0
+
+_page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+""" Resident memory of the process in bytes (None where /proc is not available) """
+def _resident_memory():
+	try:
+		with open('/proc/self/statm') as file:
+			return (int)(file.read().split()[1]) * _page_size
+	except (OSError, IndexError, ValueError):
+		return None
+
+
+# ===========================================
+# =           MetricsServer Class           =
+# ===========================================
+
+class MetricsServer:
+
+	""" Constructor (serves the metrics on http://host:port/metrics in a background thread; port 0 picks a free port) """
+	def __init__(self, metrics, **kwargs):
+		host = kwargs['host'] if 'host' in kwargs else '127.0.0.1'
+		port = kwargs['port'] if 'port' in kwargs else 9100
+		handler = type('MetricsHandler', (_MetricsHandler,), {'metrics': metrics})
+		self._server = ThreadingHTTPServer((host, port), handler)
+		self._server.daemon_threads = True
+		self.address = self._server.server_address
+		self._thread = threading.Thread(target=self._server.serve_forever, name='MetricsServer', daemon=True)
+		self._thread.start()
+
+	def close(self):
+		self._server.shutdown()
+		self._server.server_close()
+
+
+# ======  End of MetricsServer Class  =======
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+	metrics = None
+
+	def do_GET(self):
+		if self.path.split('?')[0] != '/metrics':
+			self.send_error(404)
+			return
+		body = self.metrics.format().encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	""" Scrapes are not logged """
+	def log_message(self, format, *args):
+		pass
@@ -0,0 +1,59 @@
+import math
+import numba
+import numpy as np
+
+"""
+   Numba compiled kernels of backends.NumbaBackend (this module is only imported when that backend is created)
+"""
+
+@numba.njit(cache=True)
+def _within(x, y, a, b, distance, limit):
+	dx = abs(x[a] - x[b])
+	dy = abs(y[a] - y[b])
+	return dx <= distance and dy <= distance and dx * dx + dy * dy <= limit
+
+""" Pairs of the same and the neighbour cells within distance (cells sorted, entities ordered by cell); only counts them without output arrays """
+@numba.njit(cache=True)
+def scan_pairs(x, y, order, cells, starts, counts, width, distance, limit, first, second):
+	found = 0
+	offsets = ((1, 0), (-1, 1), (0, 1), (1, 1))
+	for c in range(len(cells)):
+		start = starts[c]
+		end = start + counts[c]
+		for p in range(start, end):
+			for q in range(p + 1, end):
+				if _within(x, y, order[p], order[q], distance, limit):
+					if first is not None:
+						first[found] = min(order[p], order[q])
+						second[found] = max(order[p], order[q])
+					found += 1
+		for ox, oy in offsets:
+			neighbour = cells[c] + oy * width + ox
+			n = np.searchsorted(cells, neighbour)
+			if n >= len(cells) or cells[n] != neighbour:
+				continue
+			for p in range(start, end):
+				for q in range(starts[n], starts[n] + counts[n]):
+					if _within(x, y, order[p], order[q], distance, limit):
+						if first is not None:
+							first[found] = min(order[p], order[q])
+							second[found] = max(order[p], order[q])
+						found += 1
+	return found
+
+""" Move the entities in place, reflecting them from the walls """
+@numba.njit(cache=True)
+def move(x, y, direction, distance, width, height):
+	for i in range(len(x)):
+		dx = math.cos(direction[i]) * distance
+		dy = math.sin(direction[i]) * distance
+		new_x = x[i] + dx
+		new_y = y[i] + dy
+		if new_x < 0 or new_x > width:
+			new_x = x[i] - dx
+			direction[i] = math.pi - direction[i]
+		if new_y < 0 or new_y > height:
+			new_y = y[i] - dy
+			direction[i] = 2 * math.pi - direction[i]
+		x[i] = new_x
+		y[i] = new_y
@@ -0,0 +1,144 @@
+import multiprocessing, os
+import numpy as np
+from backends import BACKENDS, create_backend
+from contacts import merge_sorted, pack_pairs, unpack_pairs
+from engine import Engine
+
+"""
+   The area is cut into horizontal tiles. A worker finds the pairs of a tile among the entities
+   of the tile and of a halo above it (everything within infectious distance of the tile's top edge).
+   A pair belongs to the tile of its lower entity: pairs with an entity in the tile are kept, pairs
+   with both entities in the halo are left to the tile above. The union of the tiles is therefore
+   exactly the set of pairs the single process engine finds, and the infection rolls, which stay in
+   the main process in pair order, give the same run for the same seed.
+
+   The main process keeps the entity indices ordered by y in shared memory, so a tile and its halo
+   are two index ranges of that order (found with one binary search per edge). The order is sorted
+   again at every step, which is fast because the entities move little between two steps.
+   The workers run the kernels of the engine's backend on the entities of their tiles.
+"""
+
+# positions and directions of the entities and their order by y in the workers (views of the shared memory) and their backend
+_x = None
+_y = None
+_direction = None
+_order = None
+_backend = None
+
+def _init_worker(x, y, direction, order, size, backend):
+	global _x, _y, _direction, _order, _backend
+	_x = np.frombuffer(x, dtype=np.float64, count=size)
+	_y = np.frombuffer(y, dtype=np.float64, count=size)
+	_direction = np.frombuffer(direction, dtype=np.float64, count=size)
+	_order = np.frombuffer(order, dtype=np.int64, count=size)
+	_backend = create_backend(backend)
+
+""" Sorted packed keys of the pairs which belong to a tile (executed in the worker processes) """
+def _tile_pairs(job):
+	start, end, halo_end, distance = job
+	# the entities of the tile come first, then the ones of the halo
+	subset = _order[start:halo_end]
+	i, j = _backend.pairs(_x[subset], _y[subset], distance)
+	own = end - start
+	kept = (i < own) | (j < own)
+	first = subset[i[kept]]
+	second = subset[j[kept]]
+	keys = pack_pairs(np.minimum(first, second), np.maximum(first, second))
+	keys.sort()
+	return keys
+
+""" Move the entities of a tile (executed in the worker processes) """
+def _move_tile(job):
+	start, end, distance, area_size = job
+	subset = _order[start:end]
+	x = _x[subset]
+	y = _y[subset]
+	direction = _direction[subset]
+	_backend.move(x, y, direction, distance, area_size)
+	_x[subset] = x
+	_y[subset] = y
+	_direction[subset] = direction
+
+# ============================================
+# =           ParallelEngine Class           =
+# ============================================
+
+class ParallelEngine(Engine):
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		super(ParallelEngine, self).__init__(**kwargs)
+		# the workers create the backend again by its name
+		if BACKENDS.get(getattr(self.backend, 'name', None)) is not type(self.backend):
+			raise ValueError(f"the parallel engine needs a backend of backends.py, not {self.backend!r}")
+		self._processes = kwargs['processes'] if 'processes' in kwargs else os.cpu_count()
+		self._tiles_per_process = kwargs['tiles_per_process'] if 'tiles_per_process' in kwargs else 2 # more tiles than workers balance uneven densities
+		self._pool = None
+		self._shared_population = None # the population whose arrays are in the shared memory
+		self._order = None # entity indices ordered by y (shared with the workers)
+		self._bounds = None # first index of every tile in the order and the end of the last one
+
+	""" Put the arrays of the current population into shared memory (and start workers for them) """
+	def _share(self):
+		entities = self.entities
+		size = len(entities)
+		self.close()
+		arrays = []
+		for name in ('x', 'y', 'direction'):
+			shared = multiprocessing.RawArray('d', max(size, 1))
+			array = np.frombuffer(shared, dtype=np.float64, count=size)
+			np.copyto(array, getattr(entities, name))
+			setattr(entities, name, array)
+			arrays.append(shared)
+		shared = multiprocessing.RawArray('q', max(size, 1))
+		self._order = np.frombuffer(shared, dtype=np.int64, count=size)
+		self._order[:] = np.arange(size)
+		arrays.append(shared)
+		self._pool = multiprocessing.Pool(self._processes, _init_worker, tuple(arrays) + (size, self.backend.name))
+		self._shared_population = entities
+		self._bounds = None
+		self.trace('Population of %d entities shared with %d worker processes', size, self._processes)
+
+	def _find_pairs(self):
+		if self._shared_population is not self.entities:
+			self._share()
+		distance = self.infectious_distance
+		height = self.area_size[1]
+		order = self._order
+		y = self.entities.y[order]
+		# the previous order is almost sorted, which the stable sort (a merge sort) makes use of
+		sort = np.argsort(y, kind='stable')
+		np.copyto(order, order[sort])
+		y = y[sort]
+		tiles = max(1, min(self._processes * self._tiles_per_process, (int)(height // max(distance, 1))))
+		# the first and the last tile are open, so entities on (or beyond) the border belong somewhere
+		tops = np.array([height * k / tiles for k in range(1, tiles)])
+		bounds = np.concatenate(([0], np.searchsorted(y, tops, side='left'), [len(y)]))
+		# the halo gets one extra pixel so rounding can not leave a pair out
+		halo_ends = np.concatenate((np.searchsorted(y, tops + distance + 1, side='right'), [len(y)]))
+		self._bounds = bounds
+		jobs = [((int)(bounds[k]), (int)(bounds[k + 1]), (int)(halo_ends[k]), distance) for k in range(tiles)]
+		parts = self._pool.map(_tile_pairs, jobs, chunksize=1)
+		return unpack_pairs(merge_sorted(parts))
+
+	def _move(self, distance):
+		if self._shared_population is not self.entities:
+			self._share()
+		bounds = self._bounds
+		if bounds is None:
+			# no pairs were searched since the population was shared: equal parts of the order
+			size = len(self.entities)
+			bounds = [size * k // self._processes for k in range(self._processes + 1)]
+		jobs = [((int)(bounds[k]), (int)(bounds[k + 1]), distance, self.area_size) for k in range(len(bounds) - 1)]
+		self._pool.map(_move_tile, jobs, chunksize=1)
+
+	""" Stop the worker processes """
+	def close(self):
+		if self._pool is not None:
+			self._pool.terminate()
+			self._pool.join()
+			self._pool = None
+		self._shared_population = None
+
+
+# ======  End of ParallelEngine Class  =======
@@ -0,0 +1,221 @@
+import heapq, math
+import numpy as np
+
+# ====================================
+# =           Entity Class           =
+# ====================================
+
+class Entity:
+
+	STATE_HEALTHY = 1
+	STATE_INFECTED = 2
+	STATE_IMMUNE = 3
+	STATES = (STATE_HEALTHY, STATE_INFECTED, STATE_IMMUNE)
+	# state which follows a state when its time is up
+	NEXT_STATE = {STATE_INFECTED: STATE_IMMUNE, STATE_IMMUNE: STATE_HEALTHY}
+
+	__slots__ = ('_population', 'id')
+
+	""" Constructor (a view of one row of the population) """
+	def __init__(self, population, index):
+		self._population = population
+		self.id = index
+
+	@property
+	def position(self):
+		return ((float)(self._population.x[self.id]), (float)(self._population.y[self.id])) # (x, y)
+
+	@position.setter
+	def position(self, value):
+		self._population.x[self.id] = value[0]
+		self._population.y[self.id] = value[1]
+
+	@property
+	def direction(self):
+		return (float)(self._population.direction[self.id]) # 0-2π
+
+	@direction.setter
+	def direction(self, value):
+		self._population.direction[self.id] = value
+
+	@property
+	def state(self):
+		return (int)(self._population.state[self.id])
+
+	@state.setter
+	def state(self, value):
+		self._population.set_state(self.id, value, self.state_time)
+
+	@property
+	def state_time(self):
+		return (int)(self._population.state_time[self.id]) # in milliseconds
+
+	@state_time.setter
+	def state_time(self, value):
+		# the expiry of the state is scheduled again from the new time
+		self._population.set_state(self.id, self.state, value)
+
+	def __str__(self):
+		return f"{{id: {self.id}, state: {self.state}, position: {self.position}, direction: {self.direction}, state_time: {self.state_time}}}"
+
+
+# ======  End of Entity Class  =======
+
+
+# ========================================
+# =           Population Class           =
+# ========================================
+
+class Population:
+
+	""" Constructor """
+	def __init__(self, size):
+		self.x = np.zeros(size, dtype=np.float64)
+		self.y = np.zeros(size, dtype=np.float64)
+		self.direction = np.zeros(size, dtype=np.float64) # 0-2π
+		self.state = np.full(size, Entity.STATE_HEALTHY, dtype=np.int8)
+		self.state_time = np.zeros(size, dtype=np.int64) # in milliseconds
+		# members of every state (the first counts[state] items are valid) and the position of each entity in its state's members
+		self._members = {state: np.zeros(size, dtype=np.int64) for state in Entity.STATES}
+		self._members[Entity.STATE_HEALTHY][:] = np.arange(size)
+		self._counts = {state: 0 for state in Entity.STATES}
+		self._counts[Entity.STATE_HEALTHY] = size
+		self._position = np.arange(size, dtype=np.int64)
+		# scheduled state expiries: heap of (due time, index, state, state time), outdated items are skipped when popped
+		self._durations = {}
+		self._expiries = []
+
+	""" How long the states last (state -> milliseconds) """
+	@property
+	def durations(self):
+		return dict(self._durations)
+
+	""" Sequence protocol (entity views) """
+	def __len__(self):
+		return len(self.state)
+
+	def __getitem__(self, index):
+		if index < 0:
+			index += len(self)
+		if index < 0 or index >= len(self):
+			raise IndexError('entity index out of range')
+		return Entity(self, index)
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield Entity(self, i)
+
+	""" Members of every state after each other in the order of Entity.STATES (with counts() this is everything restore() needs besides the entity arrays) """
+	def member_order(self):
+		return np.concatenate([self.members(state) for state in Entity.STATES]).astype(np.int64)
+
+	""" Rebuild a population from its saved arrays (see member_order()) """
+	@classmethod
+	def restore(cls, x, y, direction, state, state_time, member_order, durations):
+		population = cls(len(state))
+		np.copyto(population.x, x)
+		np.copyto(population.y, y)
+		np.copyto(population.direction, direction)
+		np.copyto(population.state, state)
+		np.copyto(population.state_time, state_time)
+		start = 0
+		for s in Entity.STATES:
+			members = member_order[start:start + np.count_nonzero(population.state == s)]
+			population._members[s][:len(members)] = members
+			population._counts[s] = len(members)
+			population._position[members] = np.arange(len(members))
+			start += len(members)
+		# only the current expiry of every entity is valid in the heap, and exactly these are rebuilt
+		population.set_durations(durations)
+		return population
+
+	""" Memory used by the entity arrays (in bytes) """
+	def nbytes(self):
+		return self.x.nbytes + self.y.nbytes + self.direction.nbytes + self.state.nbytes + self.state_time.nbytes + self._position.nbytes + sum(members.nbytes for members in self._members.values())
+
+	""" Change the state of an entity (every state change has to go through here to keep the counters right) """
+	def set_state(self, index, state, time):
+		old_state = self.state[index]
+		self.state_time[index] = time
+		if old_state == state:
+			self._schedule(index, state, time)
+			return
+		# swap the entity with the last member of its old state, then append it to the new one
+		members = self._members[old_state]
+		position = self._position[index]
+		last = members[self._counts[old_state] - 1]
+		members[position] = last
+		self._position[last] = position
+		self._counts[old_state] -= 1
+		self._members[state][self._counts[state]] = index
+		self._position[index] = self._counts[state]
+		self._counts[state] += 1
+		self.state[index] = state
+		self._schedule(index, state, time)
+
+	""" Set how long the states last (state -> milliseconds), rescheduling the pending expiries """
+	def set_durations(self, durations):
+		if durations == self._durations:
+			return
+		self._durations = dict(durations)
+		self._expiries = []
+		for state, duration in self._durations.items():
+			members = self.members(state)
+			times = self.state_time[members]
+			self._expiries.extend(zip((times + duration).tolist(), members.tolist(), [state] * len(members), times.tolist()))
+		heapq.heapify(self._expiries)
+
+	def _schedule(self, index, state, time):
+		if state in self._durations:
+			heapq.heappush(self._expiries, ((int)(time) + self._durations[state], (int)(index), state, (int)(time)))
+
+	""" Number of entities in a state """
+	def count(self, state):
+		return self._counts[state]
+
+	""" Number of healthy, infected and immune entities """
+	def counts(self):
+		return (self._counts[Entity.STATE_HEALTHY], self._counts[Entity.STATE_INFECTED], self._counts[Entity.STATE_IMMUNE])
+
+	""" Indices of the entities in a state (a read-only view, valid until the next state change) """
+	def members(self, state):
+		members = self._members[state][:self._counts[state]]
+		members.flags.writeable = False
+		return members
+
+	""" A uniformly chosen entity in a state (None if there is not any) """
+	def sample(self, state, rng):
+		if self._counts[state] == 0:
+			return None
+		return (int)(self._members[state][rng.randrange(self._counts[state])])
+
+	""" Move the entities whose state expired by time to the next state (costs only as much as the number of expiries) """
+	def update_states(self, time):
+		expired = {state: set() for state in Entity.NEXT_STATE}
+		while self._expiries and self._expiries[0][0] <= time:
+			due, index, state, state_time = heapq.heappop(self._expiries)
+			# skip the items of entities which changed state since they were scheduled
+			if self.state[index] == state and self.state_time[index] == state_time:
+				expired[state].add(index)
+		for state in (Entity.STATE_INFECTED, Entity.STATE_IMMUNE):
+			for i in sorted(expired[state]):
+				self.set_state(i, Entity.NEXT_STATE[state], time)
+
+
+# ======  End of Population Class  =======
+
+
+""" Move the entities of position and direction arrays in place (any slice of the population can be moved independently) """
+def move_arrays(x, y, direction, distance, area_size):
+	dx = np.cos(direction) * distance
+	dy = np.sin(direction) * distance
+	nx = x + dx
+	ny = y + dy
+	bounce = (nx < 0) | (nx > area_size[0])
+	nx[bounce] = x[bounce] - dx[bounce]
+	direction[bounce] = math.pi - direction[bounce]
+	bounce = (ny < 0) | (ny > area_size[1])
+	ny[bounce] = y[bounce] - dy[bounce]
+	direction[bounce] = 2 * math.pi - direction[bounce]
+	np.copyto(x, nx)
+	np.copyto(y, ny)
@@ -0,0 +1,113 @@
+import csv, json
+from time import perf_counter
+import numpy as np
+
+# ====================================
+# =           Window Class           =
+# ====================================
+
+class Window:
+
+	""" Constructor (the last size values, kept in a ring buffer) """
+	def __init__(self, size):
+		self._values = np.zeros(size, dtype=np.float64)
+		self._next = 0
+		self.count = 0 # every value added so far
+
+	def add(self, value):
+		self._values[self._next] = value
+		self._next = (self._next + 1) % len(self._values)
+		self.count += 1
+
+	""" Values in the window (a copy, in no particular order) """
+	def values(self):
+		return self._values[:min(self.count, len(self._values))].copy()
+
+
+# ======  End of Window Class  =======
+
+
+# ======================================
+# =           Profiler Class           =
+# ======================================
+
+class Profiler:
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		self._size = kwargs['window'] if 'window' in kwargs else 1024 # number of recent samples the statistics are computed from
+		self.enabled = kwargs['enabled'] if 'enabled' in kwargs else True
+		self._phases = {} # phase -> window of durations (in seconds)
+		self._counters = {} # counter -> (window of timestamps, window of amounts)
+
+	""" Record the duration of a phase (in seconds) """
+	def add(self, phase, seconds):
+		if not self.enabled:
+			return
+		window = self._phases.get(phase)
+		if window is None:
+			window = self._phases[phase] = Window(self._size)
+		window.add(seconds)
+
+	""" Record that something happened amount times now (the statistics give its rate per second) """
+	def count(self, counter, amount = 1):
+		if not self.enabled:
+			return
+		windows = self._counters.get(counter)
+		if windows is None:
+			windows = self._counters[counter] = (Window(self._size), Window(self._size))
+		windows[0].add(perf_counter())
+		windows[1].add(amount)
+
+	def clear(self):
+		self._phases = {}
+		self._counters = {}
+
+	""" Statistics of the recent samples: phase -> count, mean, p50, p99 and max (in milliseconds) and counter -> rate (per second) """
+	def summary(self):
+		phases = {}
+		for phase, window in list(self._phases.items()):
+			values = window.values() * 1000
+			if len(values) == 0:
+				continue
+			p50, p99 = np.percentile(values, (50, 99))
+			phases[phase] = {'count': window.count, 'mean': (float)(values.mean()), 'p50': (float)(p50), 'p99': (float)(p99), 'max': (float)(values.max())}
+		rates = {}
+		for counter, (timestamps, amounts) in list(self._counters.items()):
+			timestamps = timestamps.values()
+			amounts = amounts.values()
+			if len(timestamps) < 2:
+				continue
+			first = np.argmin(timestamps)
+			span = timestamps.max() - timestamps[first]
+			if span > 0:
+				# the amount of the oldest sample happened before the measured span
+				rates[counter] = (float)((amounts.sum() - amounts[first]) / span)
+		return {'phases': phases, 'rates': rates}
+
+	""" Summary as lines of text """
+	def format(self):
+		summary = self.summary()
+		lines = [f"{'':<10} {'p50':>8} {'p99':>8}"]
+		for phase, stats in summary['phases'].items():
+			lines.append(f"{phase:<10} {stats['p50']:>5.2f} ms {stats['p99']:>5.2f} ms")
+		for counter, rate in summary['rates'].items():
+			lines.append(f"{counter + '/s':<10} {rate:>11.0f}")
+		return '\n'.join(lines)
+
+	""" Write the summary into a JSON (.json) or CSV file """
+	def export(self, path):
+		summary = self.summary()
+		with open(path, 'w', newline='') as file:
+			if path.lower().endswith('.json'):
+				json.dump(summary, file, indent='\t')
+				return
+			writer = csv.writer(file)
+			writer.writerow(['name', 'count', 'mean_ms', 'p50_ms', 'p99_ms', 'max_ms', 'per_second'])
+			for phase, stats in summary['phases'].items():
+				writer.writerow([phase, stats['count']] + [f"{stats[key]:.4f}" for key in ('mean', 'p50', 'p99', 'max')] + [''])
+			for counter, rate in summary['rates'].items():
+				writer.writerow([counter, '', '', '', '', '', f"{rate:.2f}"])
+
+
+# ======  End of Profiler Class  =======
@@ -0,0 +1,181 @@
+import os, struct, threading
+import numpy as np
+from population import Entity
+
+"""
+   File layout:
+     header: magic, version, entity number, area width and height, interval, key frame interval, delta scale
+     groups: one key frame and (key frame interval - 1) delta frames, every group has the same size
+
+   key frame:   time (int64), x (float32 * n), y (float32 * n), state (int8 * n)
+   delta frame: time (int64), dx (int16 * n), dy (int16 * n), state (int8 * n)
+   (deltas are in 1 / delta scale px, relative to the previous decoded frame)
+"""
+MAGIC = b'HITR'
+VERSION = 1
+HEADER = struct.Struct('<4sHIffIIf')
+
+# ==============================================
+# =           TrajectoryWriter Class           =
+# ==============================================
+
+class TrajectoryWriter:
+
+	""" Constructor """
+	def __init__(self, path, entity_number, area_size, **kwargs):
+		self._entity_number = entity_number
+		self._interval = kwargs['interval'] if 'interval' in kwargs else 100 # in milliseconds
+		# delta encoding: key frame in every key_frame_interval frames (1 means no delta frames)
+		self._key_frame_interval = kwargs['key_frame_interval'] if 'key_frame_interval' in kwargs else 1
+		self._delta_scale = kwargs['delta_scale'] if 'delta_scale' in kwargs else 64.0
+		self._file = open(path, 'wb', buffering=kwargs['buffer_size'] if 'buffer_size' in kwargs else 1 << 20)
+		self._file.write(HEADER.pack(MAGIC, VERSION, entity_number, area_size[0], area_size[1], self._interval, self._key_frame_interval, self._delta_scale))
+		self._next_time = 0
+		self._x = None # positions as the reader will decode them
+		self._y = None
+		self._lock = threading.Lock() # the recording can be closed from another thread
+		self.frames = 0
+
+	""" Record the population if the next frame is due """
+	def record(self, time, population):
+		if time < self._next_time:
+			return
+		with self._lock:
+			if not self._file.closed:
+				self._write(time, population)
+
+	def _write(self, time, population):
+		while self._next_time <= time:
+			self._next_time += self._interval
+		self._file.write(struct.pack('<q', (int)(time)))
+		if self.frames % self._key_frame_interval == 0:
+			self._x = population.x.astype(np.float32)
+			self._y = population.y.astype(np.float32)
+			self._file.write(self._x.tobytes())
+			self._file.write(self._y.tobytes())
+		else:
+			# the deltas are taken from the decoded positions so rounding errors do not add up
+			dx = self._quantize(population.x - self._x)
+			dy = self._quantize(population.y - self._y)
+			self._x += dx / np.float32(self._delta_scale)
+			self._y += dy / np.float32(self._delta_scale)
+			self._file.write(dx.tobytes())
+			self._file.write(dy.tobytes())
+		self._file.write(population.state.tobytes())
+		self.frames += 1
+
+	def _quantize(self, delta):
+		return np.clip(np.rint(delta * self._delta_scale), -32768, 32767).astype(np.int16)
+
+	def close(self):
+		with self._lock:
+			self._file.close()
+
+
+# ======  End of TrajectoryWriter Class  =======
+
+
+# ==============================================
+# =           TrajectoryReader Class           =
+# ==============================================
+
+class TrajectoryReader:
+
+	""" Constructor """
+	def __init__(self, path):
+		with open(path, 'rb') as file:
+			header = file.read(HEADER.size)
+		if len(header) < HEADER.size:
+			raise ValueError(f"{path} is not a trajectory file")
+		magic, version, self.entity_number, width, height, self.interval, self._key_frame_interval, self._delta_scale = HEADER.unpack(header)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError(f"{path} is not a trajectory file (or it has an unsupported version)")
+		self.area_size = (width, height)
+		n = self.entity_number
+		self._key_frame_size = 8 + 9 * n
+		self._delta_frame_size = 8 + 5 * n
+		self._group_size = self._key_frame_size + (self._key_frame_interval - 1) * self._delta_frame_size
+		size = os.path.getsize(path) - HEADER.size
+		# a partially written last frame (e.g. the recording is still running) is ignored
+		groups, rest = divmod(size, self._group_size)
+		self.frames = groups * self._key_frame_interval + (1 if rest >= self._key_frame_size else 0)
+		if rest > self._key_frame_size:
+			self.frames += (rest - self._key_frame_size) // self._delta_frame_size
+		self._data = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size, shape=(size,)) if size > 0 else np.zeros(0, dtype=np.uint8)
+
+	def __len__(self):
+		return self.frames
+
+	""" Decode a frame (only reads the frames of its group up to it) """
+	def frame(self, index):
+		if index < 0 or index >= self.frames:
+			raise IndexError('frame index out of range')
+		n = self.entity_number
+		group, position = divmod(index, self._key_frame_interval)
+		offset = group * self._group_size
+		x = self._data[offset + 8:offset + 8 + 4 * n].view(np.float32).astype(np.float64)
+		y = self._data[offset + 8 + 4 * n:offset + 8 + 8 * n].view(np.float32).astype(np.float64)
+		if position == 0:
+			return Frame(self._time(offset), x, y, np.array(self._data[offset + 8 + 8 * n:offset + 8 + 9 * n].view(np.int8)))
+		# decode in float32 the same way as the writer did
+		x = x.astype(np.float32)
+		y = y.astype(np.float32)
+		offset += self._key_frame_size
+		for i in range(position):
+			x += self._data[offset + 8:offset + 8 + 2 * n].view(np.int16) / np.float32(self._delta_scale)
+			y += self._data[offset + 8 + 2 * n:offset + 8 + 4 * n].view(np.int16) / np.float32(self._delta_scale)
+			if i < position - 1:
+				offset += self._delta_frame_size
+		return Frame(self._time(offset), x.astype(np.float64), y.astype(np.float64), np.array(self._data[offset + 8 + 4 * n:offset + 8 + 5 * n].view(np.int8)))
+
+	""" Time of a frame (in milliseconds) """
+	def frame_time(self, index):
+		group, position = divmod(index, self._key_frame_interval)
+		offset = group * self._group_size
+		if position > 0:
+			offset += self._key_frame_size + (position - 1) * self._delta_frame_size
+		return self._time(offset)
+
+	""" Index of the last frame recorded at or before time (binary search on the frame times) """
+	def frame_index(self, time):
+		low = 0
+		high = self.frames - 1
+		while low < high:
+			middle = (low + high + 1) // 2
+			if self.frame_time(middle) <= time:
+				low = middle
+			else:
+				high = middle - 1
+		return low
+
+	def _time(self, offset):
+		return (int)(self._data[offset:offset + 8].view(np.int64)[0])
+
+
+# ======  End of TrajectoryReader Class  =======
+
+
+# ===================================
+# =           Frame Class           =
+# ===================================
+
+class Frame:
+
+	""" Constructor (a recorded state of the population, drawable like a Population) """
+	def __init__(self, time, x, y, state):
+		self.time = time
+		self.x = x
+		self.y = y
+		self.state = state
+
+	def __len__(self):
+		return len(self.state)
+
+	def members(self, state):
+		return np.flatnonzero(self.state == state)
+
+	def counts(self):
+		return tuple((int)(np.count_nonzero(self.state == state)) for state in Entity.STATES)
+
+
+# ======  End of Frame Class  =======
@@ -0,0 +1,172 @@
+import cairo, math, time
+import numpy as np
+from population import Entity
+
+# ======================================
+# =           Renderer Class           =
+# ======================================
+
+class Renderer:
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		self.border_color = kwargs['border_color'] if 'border_color' in kwargs else (0.7, 0.7, 0.7)
+		self.border_width = kwargs['border_width'] if 'border_width' in kwargs else 10
+		self.entity_radius = kwargs['entity_radius'] if 'entity_radius' in kwargs else 5
+		self.entity_color = kwargs['entity_color'] if 'entity_color' in kwargs else {
+			Entity.STATE_HEALTHY: (0, 1, 0),
+			Entity.STATE_INFECTED: (1, 0, 0),
+			Entity.STATE_IMMUNE: (0, 0, 1),
+		}
+		# above this many entities squares are drawn instead of circles
+		self.square_threshold = kwargs['square_threshold'] if 'square_threshold' in kwargs else 2000
+		# above this many visible entities a density map is drawn instead of the entities
+		self.heatmap_threshold = kwargs['heatmap_threshold'] if 'heatmap_threshold' in kwargs else 50000
+		self.heatmap_cell = kwargs['heatmap_cell'] if 'heatmap_cell' in kwargs else 4 # size of a cell of the density map in screen px
+		# viewport: zoom (None means the world fits the drawing area) and the world position at the center of the drawing area
+		self.zoom = None
+		self.center = None
+		self._background = None
+		self._background_key = None
+		self.frame_time = 0.0 # in milliseconds, averaged over the last frames
+		self._frame_time_smoothing = 0.1
+
+	""" Draw the area and the visible entities (the world is as large as the drawing area without the border if its size is not given) """
+	def draw(self, context, width, height, population, world_size = None):
+		start = time.perf_counter()
+		if world_size is None:
+			world_size = self.fitted_world_size(width, height)
+		zoom, center = self._viewport(width, height, world_size)
+		# world -> screen: (position - center) * zoom + screen center
+		offset_x = width / 2 - center[0] * zoom
+		offset_y = height / 2 - center[1] * zoom
+		context.set_source_surface(self._get_background(width, height, world_size, zoom, offset_x, offset_y), 0, 0)
+		context.paint()
+		radius = self.entity_radius * zoom
+		# world rectangle which can be seen (with the entities sticking in from outside)
+		left = -offset_x / zoom - self.entity_radius
+		top = -offset_y / zoom - self.entity_radius
+		right = (width - offset_x) / zoom + self.entity_radius
+		bottom = (height - offset_y) / zoom + self.entity_radius
+		visible = {}
+		for state in Entity.STATES:
+			members = population.members(state)
+			if len(members) == 0:
+				continue
+			x = population.x[members]
+			y = population.y[members]
+			inside = (x >= left) & (x <= right) & (y >= top) & (y <= bottom)
+			visible[state] = (x[inside] * zoom + offset_x, y[inside] * zoom + offset_y)
+		count = sum(len(xs) for xs, ys in visible.values())
+		if count > self.heatmap_threshold:
+			self._draw_heatmap(context, width, height, visible)
+		else:
+			squares = count > self.square_threshold
+			for state, (xs, ys) in visible.items():
+				if len(xs) == 0:
+					continue
+				color = self.entity_color[state]
+				context.set_source_rgb(color[0], color[1], color[2])
+				# one path per state, filled at once
+				if squares:
+					self._add_squares(context, xs.tolist(), ys.tolist(), radius)
+				else:
+					self._add_circles(context, xs.tolist(), ys.tolist(), radius)
+				context.fill()
+		elapsed = (time.perf_counter() - start) * 1000
+		self.frame_time += (elapsed - self.frame_time) * self._frame_time_smoothing
+
+	def _add_circles(self, context, xs, ys, radius):
+		for i in range(len(xs)):
+			context.new_sub_path()
+			context.arc(xs[i], ys[i], radius, 0, 2 * math.pi)
+
+	def _add_squares(self, context, xs, ys, radius):
+		size = 2 * radius
+		for i in range(len(xs)):
+			context.rectangle(xs[i] - radius, ys[i] - radius, size, size)
+
+	""" Density map of the visible entities: the color of a cell is the mix of the state colors, its opacity grows with the number of entities """
+	def _draw_heatmap(self, context, width, height, visible):
+		cell = self.heatmap_cell
+		columns = max((int)(math.ceil(width / cell)), 1)
+		rows = max((int)(math.ceil(height / cell)), 1)
+		total = np.zeros(columns * rows, dtype=np.float64)
+		rgb = np.zeros((columns * rows, 3), dtype=np.float64)
+		for state, (xs, ys) in visible.items():
+			cells = np.clip((ys // cell).astype(np.int64), 0, rows - 1) * columns + np.clip((xs // cell).astype(np.int64), 0, columns - 1)
+			counts = np.bincount(cells, minlength=columns * rows).astype(np.float64)
+			total += counts
+			rgb += counts[:, None] * np.array(self.entity_color[state], dtype=np.float64)
+		occupied = total > 0
+		alpha = np.zeros_like(total)
+		alpha[occupied] = np.log1p(total[occupied]) / np.log1p(total.max()) if occupied.any() else 0
+		# premultiplied ARGB32 in native byte order (BGRA on little endian machines)
+		rgb[occupied] *= (alpha[occupied] / total[occupied])[:, None]
+		pixels = np.zeros((rows, columns), dtype=np.uint32)
+		channels = np.rint(np.concatenate((alpha[:, None], rgb), axis=1) * 255).astype(np.uint32)
+		pixels.ravel()[:] = (channels[:, 0] << 24) | (channels[:, 1] << 16) | (channels[:, 2] << 8) | channels[:, 3]
+		stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, columns)
+		data = bytearray(stride * rows)
+		np.frombuffer(data, dtype=np.uint32).reshape(rows, stride // 4)[:, :columns] = pixels
+		surface = cairo.ImageSurface.create_for_data(data, cairo.FORMAT_ARGB32, columns, rows, stride)
+		context.save()
+		context.scale(cell, cell)
+		context.set_source_surface(surface, 0, 0)
+		context.get_source().set_filter(cairo.FILTER_NEAREST)
+		context.paint()
+		context.restore()
+
+	""" Size of the world which fits into the drawing area at zoom 1 """
+	def fitted_world_size(self, width, height):
+		margin = 2 * (self.border_width + self.entity_radius)
+		return (width - margin, height - margin)
+
+	""" Zoom and center in use (the fitted ones if the viewport is not set) """
+	def _viewport(self, width, height, world_size):
+		if self.zoom is None:
+			margin = 2 * (self.border_width + self.entity_radius)
+			zoom = min((width - margin) / max(world_size[0], 1), (height - margin) / max(world_size[1], 1))
+			return max(zoom, 1e-6), (world_size[0] / 2, world_size[1] / 2)
+		return self.zoom, self.center
+
+	""" Zoom by factor keeping the world position under the screen position (sx, sy) in place """
+	def zoom_at(self, factor, sx, sy, width, height, world_size):
+		zoom, center = self._viewport(width, height, world_size)
+		wx = center[0] + (sx - width / 2) / zoom
+		wy = center[1] + (sy - height / 2) / zoom
+		self.zoom = zoom * factor
+		self.center = (wx - (sx - width / 2) / self.zoom, wy - (sy - height / 2) / self.zoom)
+
+	""" Move the view by (dx, dy) screen pixels """
+	def pan(self, dx, dy, width, height, world_size):
+		zoom, center = self._viewport(width, height, world_size)
+		self.zoom = zoom
+		self.center = (center[0] - dx / zoom, center[1] - dy / zoom)
+
+	""" Show the whole world again """
+	def fit(self):
+		self.zoom = None
+		self.center = None
+
+	""" Border around the world (cached in an offscreen surface until the size or the viewport changes) """
+	def _get_background(self, width, height, world_size, zoom, offset_x, offset_y):
+		key = (width, height, world_size, zoom, offset_x, offset_y)
+		if self._background_key != key:
+			self._background = cairo.ImageSurface(cairo.FORMAT_ARGB32, max(width, 1), max(height, 1))
+			context = cairo.Context(self._background)
+			context.set_source_rgb(self.border_color[0], self.border_color[1], self.border_color[2])
+			# the border is outside the world and the entity radius around it
+			left = offset_x - self.entity_radius * zoom
+			top = offset_y - self.entity_radius * zoom
+			right = offset_x + (world_size[0] + self.entity_radius) * zoom
+			bottom = offset_y + (world_size[1] + self.entity_radius) * zoom
+			context.rectangle(left - self.border_width, top - self.border_width, right - left + 2 * self.border_width, bottom - top + 2 * self.border_width)
+			context.rectangle(left, top, right - left, bottom - top)
+			context.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)
+			context.fill()
+			self._background_key = key
+		return self._background
+
+
+# ======  End of Renderer Class  =======
@@ -0,0 +1,95 @@
+import numpy as np
+from population import Entity
+
+# ======================================
+# =           Snapshot Class           =
+# ======================================
+
+class Snapshot:
+
+	""" Constructor (a compact copy of the population which can be drawn like a Population) """
+	def __init__(self):
+		self.time = 0
+		self.x = np.zeros(0, dtype=np.float32)
+		self.y = np.zeros(0, dtype=np.float32)
+		self._order = np.zeros(0, dtype=np.int32) # members of the states after each other
+		self._counts = (0, 0, 0)
+		self._starts = (0, 0, 0)
+
+	def __len__(self):
+		return len(self.x)
+
+	""" Copy the population into this snapshot (only while no reader can see it) """
+	def fill(self, time, population):
+		size = len(population)
+		if len(self.x) != size:
+			self.x = np.zeros(size, dtype=np.float32)
+			self.y = np.zeros(size, dtype=np.float32)
+			self._order = np.zeros(size, dtype=np.int32)
+		for array in (self.x, self.y, self._order):
+			array.flags.writeable = True
+		self.time = time
+		np.copyto(self.x, population.x, casting='same_kind')
+		np.copyto(self.y, population.y, casting='same_kind')
+		start = 0
+		starts = []
+		for state in Entity.STATES:
+			members = population.members(state)
+			self._order[start:start + len(members)] = members
+			starts.append(start)
+			start += len(members)
+		self._starts = tuple(starts)
+		self._counts = population.counts()
+		for array in (self.x, self.y, self._order):
+			array.flags.writeable = False
+
+	""" Indices of the entities in a state """
+	def members(self, state):
+		start = self._starts[Entity.STATES.index(state)]
+		return self._order[start:start + self._counts[Entity.STATES.index(state)]]
+
+	""" Number of healthy, infected and immune entities """
+	def counts(self):
+		return self._counts
+
+
+# ======  End of Snapshot Class  =======
+
+
+# ============================================
+# =           SnapshotBuffer Class           =
+# ============================================
+
+class SnapshotBuffer:
+
+	""" Constructor (triple buffer: one snapshot is published, one can be read, one is written) """
+	def __init__(self):
+		self._snapshots = [Snapshot(), Snapshot(), Snapshot()]
+		self._latest = self._snapshots[0]
+		self._reading = None
+
+	"""
+	   Copy the population into a free snapshot and make it the latest (called by the simulation thread)
+	   The latest and the read snapshot are never written, so the reader never sees a half-written one.
+	"""
+	def publish(self, time, population):
+		reading = self._reading
+		latest = self._latest
+		snapshot = next(snapshot for snapshot in self._snapshots if snapshot is not latest and snapshot is not reading)
+		snapshot.fill(time, population)
+		self._latest = snapshot
+
+	"""
+	   The latest complete snapshot (called by the reader thread, it stays valid until the next acquire())
+	   The reader marks the snapshot before checking that it is still the latest, so the writer either
+	   sees the mark or the reader sees the newer snapshot and takes that one instead.
+	"""
+	def acquire(self):
+		while True:
+			snapshot = self._latest
+			self._reading = snapshot
+			if self._latest is snapshot:
+				return snapshot
+
+
+# ======  End of SnapshotBuffer Class  =======
@@ -0,0 +1,119 @@
+#!/usr/bin/python3.7
+import argparse, math, sys
+import numpy as np
+
+# neighbour cells which have to be checked from a cell (the other half is checked from the neighbours)
+NEIGHBOUR_OFFSETS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+""" Index pairs (i < j) within distance, looking only at the same and the adjacent cells of a uniform grid (returns two arrays in ascending pair order) """
+def grid_pairs(x, y, distance):
+	if len(x) < 2:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	cell_size = max(distance, 1)
+	cx = np.floor(x / cell_size).astype(np.int64)
+	cy = np.floor(y / cell_size).astype(np.int64)
+	cx -= cx.min()
+	cy -= cy.min()
+	# one empty column/row of padding on both sides, so neighbour keys never wrap to the other side
+	width = (int)(cx.max()) + 3
+	keys = (cy + 1) * width + (cx + 1)
+	order = np.argsort(keys, kind='stable')
+	cells, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+	first = []
+	second = []
+	# pairs inside the cells
+	a, b = _cell_pairs(order, starts, counts, starts, counts)
+	lower = a < b
+	first.append(a[lower])
+	second.append(b[lower])
+	# pairs with the neighbour cells
+	for ox, oy in NEIGHBOUR_OFFSETS:
+		neighbours = cells + oy * width + ox
+		position = np.minimum(np.searchsorted(cells, neighbours), len(cells) - 1)
+		found = cells[position] == neighbours
+		a, b = _cell_pairs(order, starts[found], counts[found], starts[position[found]], counts[position[found]])
+		first.append(a)
+		second.append(b)
+	i = np.concatenate(first)
+	j = np.concatenate(second)
+	within = is_within_distance(x[i], y[i], x[j], y[j], distance)
+	i, j = np.minimum(i[within], j[within]), np.maximum(i[within], j[within])
+	pair_order = np.lexsort((j, i))
+	return i[pair_order], j[pair_order]
+
+""" Every (a, b) entity pair of the cell pairs given by their start and count in order """
+def _cell_pairs(order, starts1, counts1, starts2, counts2):
+	sizes = counts1 * counts2
+	total = (int)(sizes.sum())
+	if total == 0:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	cell = np.repeat(np.arange(len(sizes)), sizes)
+	offset = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+	a = order[starts1[cell] + offset // counts2[cell]]
+	b = order[starts2[cell] + offset % counts2[cell]]
+	return a, b
+
+""" Index pairs (i < j) within distance, comparing every pair """
+def brute_force_pairs(x, y, distance):
+	first = []
+	second = []
+	for i in range(len(x) - 1):
+		j = np.arange(i + 1, len(x))
+		within = is_within_distance(x[i], y[i], x[j], y[j], distance)
+		first.append(np.full((int)(within.sum()), i, dtype=np.int64))
+		second.append(j[within])
+	if not first:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	return np.concatenate(first), np.concatenate(second)
+
+""" Contact test shared by every contact detection path """
+def is_within_distance(x1, y1, x2, y2, distance):
+	dx = np.abs(x1 - x2)
+	dy = np.abs(y1 - y2)
+	return (dx <= distance) & (dy <= distance) & (dx * dx + dy * dy <= math.pow(distance, 2))
+
+"""
+   Run the same seeded simulation with the grid and with the brute force contact detection and return
+   the first step after which their states differ (None if they never do)
+"""
+def check_grid(**kwargs):
+	from engine import Engine
+	settings = kwargs['settings'] if 'settings' in kwargs else {'entity_number': 400, 'infection_chance': 30, 'healing_time': 5, 'immunity_time': 5}
+	duration = kwargs['duration'] if 'duration' in kwargs else 30000 # in milliseconds
+	engines = []
+	for spatial_index in (True, False):
+		engine = Engine(area_size=kwargs['area_size'] if 'area_size' in kwargs else (330, 230), seed=kwargs['seed'] if 'seed' in kwargs else 0, spatial_index=spatial_index)
+		engine.change_settings(**settings)
+		engine.populate()
+		engines.append(engine)
+	grid, brute_force = engines
+	step = 0
+	while grid.time < duration:
+		for engine in engines:
+			engine.step(engine.timestep)
+		step += 1
+		# the infections are in the states and their times, the rolls in the random state
+		if grid.count_states() != brute_force.count_states() \
+			or not np.array_equal(grid.entities.state, brute_force.entities.state) \
+			or not np.array_equal(grid.entities.state_time, brute_force.entities.state_time) \
+			or grid.random.getstate() != brute_force.random.getstate():
+			return step
+	return None
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description='Check that the grid and the brute force contact detection give the same seeded run.')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the runs (default: 0)')
+	parser.add_argument('--duration', type=float, default=30, help='simulated time (sec, default: 30)')
+	args = parser.parse_args(argv)
+	step = check_grid(seed=args.seed, duration=args.duration * 1000)
+	if step is not None:
+		print(f"the grid DIFFERS from brute force after step {step}")
+		return 1
+	print('the grid gives the same infections as brute force')
+	return 0
+
+
+# -----------  Start the check  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
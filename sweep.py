@@ -0,0 +1,248 @@
+#!/usr/bin/python3.7
+import argparse, csv, itertools, multiprocessing, os, random, sys
+from engine import Engine
+from meanfield import MeanField
+import headless
+
+# type of the parameters which can be swept
+PARAMETER_TYPES = {
+	'entity_velocity': float,
+	'entity_number': int,
+	'initial_virus_carrier_number': int,
+	'infection_chance': int,
+	'healing_time': int,
+	'immunity_time': int,
+	'infectious_distance': int,
+	'timestep': int,
+}
+
+METRICS = ('peak_infection', 'peak_time', 'zero_infection_time', 'final_immunity')
+
+""" Every combination of the given parameter values """
+def parameter_grid(values):
+	names = sorted(values)
+	return [dict(zip(names, combination)) for combination in itertools.product(*(values[name] for name in names))]
+
+""" Latin hypercube sample of the given (low, high) parameter ranges """
+def latin_hypercube(ranges, samples, seed = None):
+	rng = random.Random(seed)
+	points = [{} for i in range(samples)]
+	for name in sorted(ranges):
+		low, high = ranges[name]
+		strata = list(range(samples))
+		rng.shuffle(strata)
+		for i in range(samples):
+			value = low + (strata[i] + rng.random()) / samples * (high - low)
+			points[i][name] = (int)(round(value)) if PARAMETER_TYPES[name] is int else value
+	return points
+
+""" Identifier of a run (used to resume sweeps) """
+def run_key(parameters):
+	return ';'.join(f"{name}={parameters[name]}" for name in sorted(parameters))
+
+""" Seed of a run (depends only on the base seed and the parameters, so resumed sweeps get the same seeds) """
+def run_seed(base_seed, parameters):
+	return random.Random(f"{base_seed}:{run_key(parameters)}").getrandbits(32)
+
+""" Empty summary and the report(time, healthy, infected, immune) function which fills it in sample by sample """
+def summarizer():
+	summary = {'peak_infection': 0.0, 'peak_time': 0.0, 'zero_infection_time': '', 'final_immunity': 0.0}
+	def report(time, healthy, infected, immune):
+		count = healthy + infected + immune
+		if count == 0:
+			return
+		if infected / count * 100 > summary['peak_infection']:
+			summary['peak_infection'] = infected / count * 100
+			summary['peak_time'] = time / 1000
+		if infected == 0 and summary['zero_infection_time'] == '':
+			summary['zero_infection_time'] = time / 1000
+		summary['final_immunity'] = immune / count * 100
+	return summary, report
+
+""" Run one simulation and summarize it with its mean-field estimate (executed in the worker processes) """
+def run_summary(job):
+	parameters, options = job
+	engine = Engine(area_size=options['area_size'], seed=options['seed'])
+	engine.change_settings(**options['settings'])
+	engine.change_settings(**parameters)
+	engine.populate()
+	summary, report = summarizer()
+	headless.run(engine, argparse.Namespace(**options['run']), report)
+	# the estimate is already there if the point was prescreened
+	estimate = options['estimate'] if 'estimate' in options else mean_field_summary(parameters, options)
+	return parameters, options['seed'], summary, estimate
+
+""" Summarize the mean-field estimate of a point (the expected counts are rounded like entity counts) """
+def mean_field_summary(parameters, options):
+	engine = Engine(area_size=options['area_size'])
+	engine.change_settings(**options['settings'])
+	engine.change_settings(**parameters)
+	times, healthy, infected, immune = MeanField.from_engine(engine).curve(options['run']['duration'] * 1000, options['run']['sample_interval'] * 1000)
+	summary, report = summarizer()
+	for i in range(len(times)):
+		report((float)(times[i]), (int)(round(healthy[i])), (int)(round(infected[i])), (int)(round(immune[i])))
+	return summary
+
+# ===================================
+# =           Sweep Class           =
+# ===================================
+
+class Sweep:
+
+	""" Constructor """
+	def __init__(self, path, points, **kwargs):
+		self._path = path
+		self._points = points
+		self._names = sorted(set(name for point in points for name in point))
+		self._processes = kwargs['processes'] if 'processes' in kwargs else os.cpu_count()
+		self._seed = kwargs['seed'] if 'seed' in kwargs else 0
+		# points whose mean-field peak infection (%) is below this are not simulated (None: every point is simulated)
+		self._prescreen = kwargs['prescreen'] if 'prescreen' in kwargs else None
+		self._settings = kwargs['settings'] if 'settings' in kwargs else {}
+		self._area_size = kwargs['area_size'] if 'area_size' in kwargs else (330, 230)
+		self._run = {
+			'duration': kwargs['duration'] if 'duration' in kwargs else 600,
+			'sample_interval': kwargs['sample_interval'] if 'sample_interval' in kwargs else 1,
+		}
+
+	""" Keys of the runs which are already in the results table """
+	def finished_keys(self):
+		if not os.path.exists(self._path) or os.path.getsize(self._path) == 0:
+			return set()
+		with open(self._path, newline='') as file:
+			reader = csv.DictReader(file)
+			if reader.fieldnames != self._header():
+				raise ValueError(f"{self._path} has different columns, it can not be resumed by this sweep")
+			return set(row['key'] for row in reader)
+
+	"""
+	   Run the missing points, appending their summary to the results table as they finish
+	   Every row has the mean-field estimate too, computed by the worker of the run. With prescreening
+	   the estimates are computed first (by the workers as well), the points screened out by them get
+	   only the estimate.
+	"""
+	def run(self, progress = None):
+		finished = self.finished_keys()
+		jobs = []
+		for point in self._points:
+			if run_key(point) in finished:
+				continue
+			options = {
+				'seed': run_seed(self._seed, point),
+				'settings': self._settings,
+				'area_size': self._area_size,
+				'run': self._run,
+			}
+			jobs.append((point, options))
+		new_file = not os.path.exists(self._path) or os.path.getsize(self._path) == 0
+		with open(self._path, 'a', newline='') as file, multiprocessing.Pool(self._processes) as pool:
+			writer = csv.writer(file)
+			if new_file:
+				writer.writerow(self._header())
+			if self._prescreen is not None:
+				estimates = pool.starmap(mean_field_summary, jobs)
+				prescreened = jobs
+				jobs = []
+				for (point, options), estimate in zip(prescreened, estimates):
+					if estimate['peak_infection'] < self._prescreen:
+						writer.writerow([run_key(point), ''] + [point.get(name, '') for name in self._names] + [''] * len(METRICS) + [self._format(estimate[metric]) for metric in METRICS])
+					else:
+						jobs.append((point, dict(options, estimate=estimate)))
+			file.flush()
+			for done, (point, seed, summary, estimate) in enumerate(pool.imap_unordered(run_summary, jobs), 1):
+				writer.writerow([run_key(point), seed] + [point.get(name, '') for name in self._names] + [self._format(summary[metric]) for metric in METRICS] + [self._format(estimate[metric]) for metric in METRICS])
+				file.flush()
+				if progress is not None:
+					progress(done, len(jobs), point)
+		return len(jobs)
+
+	def _header(self):
+		return ['key', 'seed'] + self._names + list(METRICS) + ['mf_' + metric for metric in METRICS]
+
+	def _format(self, value):
+		return f"{value:.2f}" if isinstance(value, float) else value
+
+
+# ======  End of Sweep Class  =======
+
+
+""" Parse 'name=v1,v2,...' """
+def grid_argument(value):
+	name, values = _split_parameter(value)
+	try:
+		return name, [_parameter_value(name, v) for v in values.split(',')]
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"invalid values: '{value}'")
+
+""" Parse 'name=low:high' """
+def range_argument(value):
+	name, values = _split_parameter(value)
+	try:
+		low, high = values.split(':')
+		return name, (_parameter_value(name, low), _parameter_value(name, high))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"invalid range: '{value}' (expected name=low:high)")
+
+""" Value of a parameter (a timestep has to be positive, a step of no time would never end a run) """
+def _parameter_value(name, value):
+	value = PARAMETER_TYPES[name](value)
+	if name == 'timestep' and value <= 0:
+		raise argparse.ArgumentTypeError(f"timestep must be greater than 0: {value}")
+	return value
+
+def _split_parameter(value):
+	if '=' not in value:
+		raise argparse.ArgumentTypeError(f"invalid parameter: '{value}'")
+	name, values = value.split('=', 1)
+	name = name.replace('-', '_')
+	if name not in PARAMETER_TYPES:
+		raise argparse.ArgumentTypeError(f"unknown parameter: '{name}'")
+	return name, values
+
+def create_parser():
+	parser = argparse.ArgumentParser(description='Run headless simulations over a parameter grid in parallel.')
+	headless.add_settings_arguments(parser)
+	parser.add_argument('--grid', type=grid_argument, action='append', default=[], metavar='NAME=V1,V2,...', help='values of a swept parameter (repeatable)')
+	parser.add_argument('--lhs', type=range_argument, action='append', default=[], metavar='NAME=LOW:HIGH', help='range of a parameter sampled with a latin hypercube (repeatable)')
+	parser.add_argument('--samples', type=int, default=10, help='number of latin hypercube samples (default: 10)')
+	parser.add_argument('--seed', type=int, default=0, help='base seed (the seed of a run is derived from it and the parameters)')
+	parser.add_argument('--sample-interval', type=float, default=1, help='time between the samples used by the metrics (sec, default: 1)')
+	parser.add_argument('--prescreen-min-peak', type=float, metavar='PERCENT', help='do not simulate the points whose mean-field peak infection is below this (they get only the estimate)')
+	parser.add_argument('--processes', type=int, default=os.cpu_count(), help='number of worker processes (default: number of cores)')
+	parser.add_argument('--output', '-o', required=True, help='results table (CSV); an existing table is resumed')
+	return parser
+
+def main(argv = None):
+	args = create_parser().parse_args(argv)
+	if args.grid and args.lhs:
+		print('--grid and --lhs can not be combined', file=sys.stderr)
+		return 2
+	if args.lhs:
+		points = latin_hypercube(dict(args.lhs), args.samples, args.seed)
+	else:
+		points = parameter_grid(dict(args.grid))
+	sweep = Sweep(
+		args.output,
+		points,
+		processes=args.processes,
+		seed=args.seed,
+		settings=headless.settings_from_args(args),
+		area_size=args.area_size,
+		duration=args.duration,
+		sample_interval=args.sample_interval,
+		prescreen=args.prescreen_min_peak,
+	)
+	def progress(done, total, point):
+		print(f"[{done}/{total}] {run_key(point)}", file=sys.stderr)
+	try:
+		sweep.run(progress)
+	except ValueError as e:
+		print(e, file=sys.stderr)
+		return 1
+	return 0
+
+
+# -----------  Start the sweep  -----------
+
+if __name__ == '__main__':
+	sys.exit(main())
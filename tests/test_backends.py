@@ -0,0 +1,30 @@
+import unittest
+import numpy as np
+from backends import NumpyBackend, PythonBackend, available_backends, check_conformance
+from population import Entity
+
+class ConformanceTest(unittest.TestCase):
+
+	def test_python_same_as_numpy(self):
+		# the python backend is slow, so the run is short; the positions have to be exactly the same
+		self.assertEqual(check_conformance(['numpy', 'python'], duration=5000, tolerance=0), [])
+
+	@unittest.skipUnless('numba' in available_backends(), 'numba is not installed')
+	def test_numba_same_as_numpy(self):
+		self.assertEqual(check_conformance(['numpy', 'numba']), [])
+
+	def test_infection_sources(self):
+		rng = np.random.default_rng(2)
+		state = rng.integers(1, 4, 200).astype(np.int8)
+		first = rng.integers(0, 200, 1000)
+		second = rng.integers(0, 200, 1000)
+		sources, candidates = NumpyBackend().infection_candidates(first, second, state)
+		self.assertEqual((sources, candidates), PythonBackend().infection_candidates(first, second, state))
+		self.assertTrue(len(candidates) > 0)
+		for source, candidate in zip(sources, candidates):
+			self.assertEqual(state[source], Entity.STATE_INFECTED)
+			self.assertEqual(state[candidate], Entity.STATE_HEALTHY)
+
+
+if __name__ == '__main__':
+	unittest.main()
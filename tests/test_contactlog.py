@@ -0,0 +1,42 @@
+import os, tempfile, unittest
+import numpy as np
+from contactlog import INFECTION, ContactLogReader, ContactLogWriter
+from contacts import pack_pairs
+
+class ContactLogWriterTest(unittest.TestCase):
+
+	def setUp(self):
+		handle, self.path = tempfile.mkstemp(suffix='.bin')
+		os.close(handle)
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def write_steps(self, writer, times):
+		keys = pack_pairs(np.array([0]), np.array([1]))
+		for time in times:
+			writer.record(time, keys[:0], keys, np.array([True]), [(0, 1)])
+			writer.record(time + 1, keys, keys[:0], np.zeros(0, dtype=bool), [])
+
+	def test_append_replaces_the_events_after_the_resume(self):
+		writer = ContactLogWriter(self.path, 10)
+		self.write_steps(writer, (0, 100, 200, 300))
+		writer.close()
+		writer = ContactLogWriter(self.path, 10, append=True, time=200)
+		self.assertEqual(writer.events, 6)
+		self.write_steps(writer, (200, 300))
+		writer.close()
+		reader = ContactLogReader(self.path)
+		self.assertEqual(len(reader), 12)
+		events = np.concatenate(list(reader.chunks()))
+		self.assertTrue(np.all(np.diff(events['time'].astype(np.int64)) >= 0))
+		self.assertEqual(np.count_nonzero(events['kind'] == INFECTION), 4)
+
+	def test_append_to_the_log_of_another_population(self):
+		ContactLogWriter(self.path, 10).close()
+		with self.assertRaises(ValueError):
+			ContactLogWriter(self.path, 20, append=True)
+
+
+if __name__ == '__main__':
+	unittest.main()
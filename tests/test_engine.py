@@ -0,0 +1,41 @@
+import math, unittest
+import numpy as np
+from engine import Engine
+from population import Entity
+
+class PopulateTest(unittest.TestCase):
+
+	def populate(self, entity_number, carriers, seed = 0):
+		engine = Engine(area_size=(1000, 1000), seed=seed)
+		engine.change_settings(entity_number=entity_number, initial_virus_carrier_number=carriers)
+		engine.populate()
+		return engine
+
+	def test_carriers_and_bounds(self):
+		engine = self.populate(1000, 30)
+		entities = engine.entities
+		self.assertEqual(entities.counts(), (970, 30, 0))
+		self.assertTrue(np.all(entities.state[entities.members(Entity.STATE_INFECTED)] == Entity.STATE_INFECTED))
+		self.assertTrue(np.all((entities.x >= 0) & (entities.x < 1000) & (entities.y >= 0) & (entities.y < 1000)))
+		# more carriers than entities infects everyone
+		self.assertEqual(self.populate(10, 20).entities.counts(), (0, 10, 0))
+
+	def test_same_seed_same_population(self):
+		first = self.populate(1000, 10, seed=3).entities
+		second = self.populate(1000, 10, seed=3).entities
+		for name in ('x', 'y', 'direction', 'state'):
+			np.testing.assert_array_equal(getattr(first, name), getattr(second, name))
+
+	def test_million_entities(self):
+		for carriers in (5000, 1000000):
+			entities = self.populate(1000000, carriers).entities
+			self.assertEqual(entities.counts(), (1000000 - carriers, carriers, 0))
+			infected = entities.members(Entity.STATE_INFECTED)
+			# every carrier is a different entity, and only the carriers are infected
+			self.assertEqual(len(np.unique(infected)), carriers)
+			self.assertEqual(np.count_nonzero(entities.state == Entity.STATE_INFECTED), carriers)
+			self.assertTrue(np.all((entities.direction >= 0) & (entities.direction < math.pi)))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,15 @@
+import contextlib, io, unittest
+import headless
+
+class ArgumentsTest(unittest.TestCase):
+
+	def test_timestep_has_to_be_positive(self):
+		parser = headless.create_parser()
+		self.assertEqual(parser.parse_args(['--timestep', '50']).timestep, 50)
+		for value in ('0', '-30', 'x'):
+			with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+				parser.parse_args(['--timestep', value])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+import numpy as np
+from meanfield import MeanField
+
+class MeanFieldTest(unittest.TestCase):
+
+	def test_counts_are_kept(self):
+		for healing_time, immunity_time in ((12, 30), (1, 0), (0, 0)):
+			model = MeanField(entity_number=800, infection_chance=50, healing_time=healing_time, immunity_time=immunity_time)
+			times, healthy, infected, immune = model.curve(120000, 1000)
+			np.testing.assert_allclose(healthy + infected + immune, 800)
+			self.assertTrue(np.all((healthy >= 0) & (infected >= 0) & (immune >= 0)))
+
+	def test_epidemic_grows_and_ends(self):
+		times, healthy, infected, immune = MeanField(entity_number=800, infection_chance=30, immunity_time=1000).curve(300000, 1000)
+		self.assertGreater(infected.max(), 100)
+		self.assertEqual(infected[-1], 0)
+
+	def test_at_without_extending(self):
+		model = MeanField(entity_number=800, infection_chance=30)
+		model.prepare(0)
+		end = model._curve[0][-1]
+		self.assertEqual(model.at(10 * end, extend=False), model.at(end, extend=False))
+		self.assertEqual(model._curve[0][-1], end)
+		model.at(10 * end)
+		self.assertGreaterEqual(model._curve[0][-1], 10 * end)
+
+
+if __name__ == '__main__':
+	unittest.main()
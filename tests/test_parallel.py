@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from backends import NumpyBackend
+from contacts import merge_sorted
+from engine import Engine
+from parallel import ParallelEngine
+
+class MergeSortedTest(unittest.TestCase):
+
+	def test_same_as_sort(self):
+		rng = np.random.default_rng(0)
+		for run_number in range(7):
+			runs = [np.sort(rng.integers(0, 50, rng.integers(0, 20))) for k in range(run_number)]
+			expected = np.sort(np.concatenate(runs)) if runs else np.zeros(0, dtype=np.int64)
+			np.testing.assert_array_equal(merge_sorted(runs), expected)
+
+
+class ParallelEngineTest(unittest.TestCase):
+
+	def run_engine(self, engine, steps):
+		engine.change_settings(entity_number=2000, initial_virus_carrier_number=20, infection_chance=30)
+		engine.populate()
+		for step in range(steps):
+			engine.step(30)
+		return engine.entities
+
+	def test_same_run_as_single_process(self):
+		expected = self.run_engine(Engine(seed=3, area_size=(400, 300)), 100)
+		for processes in (1, 3):
+			engine = ParallelEngine(seed=3, area_size=(400, 300), processes=processes)
+			try:
+				actual = self.run_engine(engine, 100)
+				np.testing.assert_array_equal(actual.state, expected.state)
+				np.testing.assert_array_equal(actual.x, expected.x)
+				np.testing.assert_array_equal(actual.y, expected.y)
+			finally:
+				engine.close()
+
+	def test_same_run_with_the_python_backend(self):
+		expected = self.run_engine(Engine(seed=4, area_size=(200, 150), backend='python'), 20)
+		engine = ParallelEngine(seed=4, area_size=(200, 150), processes=2, backend='python')
+		try:
+			actual = self.run_engine(engine, 20)
+			np.testing.assert_array_equal(actual.state, expected.state)
+			np.testing.assert_array_equal(actual.x, expected.x)
+		finally:
+			engine.close()
+
+	def test_backend_objects_rejected(self):
+		class CustomBackend(NumpyBackend):
+			pass
+		with self.assertRaises(ValueError):
+			ParallelEngine(backend=CustomBackend())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+from population import Entity, Population
+
+class EntityViewTest(unittest.TestCase):
+
+	def test_state_set_through_the_view_expires(self):
+		population = Population(3)
+		population.set_durations({Entity.STATE_INFECTED: 1000, Entity.STATE_IMMUNE: 2000})
+		entity = population[1]
+		entity.state = Entity.STATE_INFECTED
+		entity.state_time = 5000
+		self.assertEqual(population.counts(), (2, 1, 0))
+		population.update_states(5999)
+		self.assertEqual(entity.state, Entity.STATE_INFECTED)
+		population.update_states(6000)
+		self.assertEqual(entity.state, Entity.STATE_IMMUNE)
+		population.update_states(8000)
+		self.assertEqual(entity.state, Entity.STATE_HEALTHY)
+		self.assertEqual(population.counts(), (3, 0, 0))
+
+
+if __name__ == '__main__':
+	unittest.main()
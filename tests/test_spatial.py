@@ -0,0 +1,24 @@
+import unittest
+import numpy as np
+from spatial import brute_force_pairs, check_grid, grid_pairs
+
+class GridPairsTest(unittest.TestCase):
+
+	def test_same_pairs_as_brute_force(self):
+		rng = np.random.default_rng(1)
+		for distance in (1, 5, 10, 23.5):
+			x = rng.uniform(0, 200, 500)
+			y = rng.uniform(0, 100, 500)
+			# points exactly on cell borders and at the distance limit
+			x[:50] = np.round(x[:50] / distance) * distance
+			y[:50] = np.round(y[:50] / distance) * distance
+			for expected, actual in zip(brute_force_pairs(x, y, distance), grid_pairs(x, y, distance)):
+				np.testing.assert_array_equal(expected, actual)
+
+	def test_seeded_run_same_infections(self):
+		for seed in (0, 1, 2):
+			self.assertIsNone(check_grid(seed=seed, duration=20000))
+
+
+if __name__ == '__main__':
+	unittest.main()
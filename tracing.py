@@ -0,0 +1,87 @@
+import atexit, collections, sys, threading, time
+from datetime import datetime
+
+# trace levels (a tracer at level n keeps the events of level 1..n, level 0 keeps nothing)
+OFF = 0
+INFO = 1
+VERBOSE = 2
+
+# ====================================
+# =           Tracer Class           =
+# ====================================
+
+class Tracer:
+
+	""" Constructor """
+	def __init__(self, **kwargs):
+		self.level = (int)(kwargs['level']) if 'level' in kwargs else OFF # can be changed at any time
+		self._path = kwargs['path'] if 'path' in kwargs else None # standard output if not given
+		self._flush_interval = kwargs['flush_interval'] if 'flush_interval' in kwargs else 0.5 # in seconds
+		# events waiting to be written: (timestamp, level, source, message, args), the oldest ones are dropped when full
+		self._events = collections.deque(maxlen=kwargs['capacity'] if 'capacity' in kwargs else 10000)
+		self.dropped = 0
+		self._lock = threading.Lock()
+		self._wake = threading.Event()
+		self._thread = None
+		self._file = None
+		self._closed = False
+
+	""" Tell if events of a level are kept (to guard building expensive arguments) """
+	def enabled(self, level):
+		return level <= self.level
+
+	""" Record an event (the message is formatted with the args only when it is written out) """
+	def trace(self, level, source, message, args = ()):
+		if level > self.level or self._closed:
+			return
+		if len(self._events) == self._events.maxlen:
+			self.dropped += 1
+		self._events.append((time.time(), level, source, message, args))
+		if self._thread is None:
+			self._start()
+
+	def _start(self):
+		with self._lock:
+			if self._thread is not None:
+				return
+			self._file = open(self._path, 'a') if self._path is not None else sys.stdout
+			self._thread = threading.Thread(target=self._run, name='Tracer', daemon=True)
+			self._thread.start()
+			atexit.register(self.close)
+
+	def _run(self):
+		while not self._closed:
+			self._wake.wait(self._flush_interval)
+			self._wake.clear()
+			self.flush()
+
+	""" Write out the waiting events """
+	def flush(self):
+		with self._lock:
+			if self._file is None:
+				return
+			while self._events:
+				timestamp, level, source, message, args = self._events.popleft()
+				try:
+					text = message % args if args else message
+				except (TypeError, ValueError) as e:
+					text = f"{message} {args!r} (formatting failed: {e})"
+				self._file.write('[' + datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') + '] ' + (source + ': ' if source else '') + text + '\n')
+			self._file.flush()
+
+	""" Write out the waiting events and stop the writer thread """
+	def close(self):
+		if self._closed:
+			return
+		self._closed = True
+		self._wake.set()
+		if self._thread is not None and self._thread is not threading.current_thread():
+			self._thread.join()
+		self.flush()
+		with self._lock:
+			if self._file is not None and self._file is not sys.stdout:
+				self._file.close()
+			self._file = None
+
+
+# ======  End of Tracer Class  =======